@@ -17,7 +17,8 @@ cell_logger.addHandler(console)
 
 cell_logger.propagate = False
 
-from cellsem_agent.agents.cell.cell_tools import search_cl
+from cellsem_agent.agents.cell.cell_tools import (prepare_local_index_tool, search_cl_async, search_cl_batch,
+                                                  search_cl_similar, search_cl_variants)
 from .annotator_config import  AnnotatorDependencies
 
 
@@ -110,11 +111,14 @@ ANNOTATOR_SYSTEM_PROMPT = """
 
     3.  **Details for Processing Each Text Span to Create a TextAnnotation:**
         * **Convert to Singular:** Before searching, convert all plural forms of cell types within the text span to their singular form.
-        * **Search for CL ID:** Use the `search_cl` tool to find a corresponding cell ontology (CL) ID and its associated label for the given text span.
+        * **Search for CL ID:** Use the `search_cl_batch` tool to find a corresponding cell ontology (CL) ID and its associated label for the given text span.
+            * **Search all text spans of all input JSON objects in a single `search_cl_batch` call.**
             * **Prioritize a direct match.**
-            * **If no direct match is found, be sure to try different combinations of synonyms.** This includes:
+            * **If no direct match is found, call `search_cl_variants` with the span and the "tissue_context" of the input JSON object.** It searches the singular form, expanded abbreviations and the 'X Y' / 'Y of X' forms in one call; pick the best candidate from its results.
+            * **If there is still no match, be sure to try different combinations of synonyms.** This includes:
                 * Substituting terms in the span with common synonyms of those terms.
                 * Converting between the forms 'X Y' and 'Y of X' where X is a tissue or anatomical structure (potentially inferred from "tissue_context" of the input Json object or common knowledge) and Y is a cell type.
+            * **Search all variants still needed in one further `search_cl_batch` call** rather than one `search_cl` call per variant.
         * **Construct TextAnnotation:** Create a `TextAnnotation` object with the following:
             * `input_name`: The value from the "name" field of the original input JSON object.
             * `text`: The exact text span that was used for the CL search (after pluralization conversion, but before any synonym substitutions used by the `search_cl` tool).
@@ -128,6 +132,9 @@ ANNOTATOR_SYSTEM_PROMPT = """
 
     You can use different functions to support curators in their tasks:
     - `search_cl` Search the Cell Ontology for a term.
+    - `search_cl_batch` Search the Cell Ontology for several terms in one call.
+    - `search_cl_variants` Search the Cell Ontology for a span and its rule-based rewrites in one call.
+    - `search_cl_similar` Find the Cell Ontology terms most similar to several spans, with similarity scores (only with a local index).
 """
 
 class TextAnnotation(BaseModel):
@@ -152,4 +159,7 @@ annotator_agent = Agent(
     defer_model_check=True,
 )
 
-annotator_agent.tool(search_cl)
+annotator_agent.tool(search_cl_async, name="search_cl")
+annotator_agent.tool(search_cl_batch)
+annotator_agent.tool(search_cl_variants)
+annotator_agent.tool(search_cl_similar, prepare=prepare_local_index_tool)
@@ -0,0 +1,47 @@
+"""
+Tools for the Annotator agent.
+"""
+import logging
+from typing import List, Tuple
+
+from cellsem_agent.agents.paper_celltype.paper_celltype_agent import CellTypeEntry
+from cellsem_agent.ontology.cl_index import CLIndex
+
+from .annotator_agent import TextAnnotation
+
+logger = logging.getLogger(__name__)
+
+NO_MATCH = "NO MATCH found"
+
+
+def pre_ground_entries(entries: List[CellTypeEntry],
+                       index: CLIndex) -> Tuple[List[TextAnnotation], List[CellTypeEntry]]:
+    """
+    Ground cell type entries whose name or full name is a CL label or exact synonym,
+    without calling the annotator agent.
+
+    An entry is resolved when at least one of its spans grounds; its other span is reported
+    as "NO MATCH found", mirroring the annotator agent output.
+
+    Args:
+        entries: The cell type entries to ground.
+        index: The local Cell Ontology index.
+
+    Returns:
+        The annotations of the resolved entries, and the entries left for the annotator agent.
+    """
+    annotations = []
+    unresolved = []
+    for entry in entries:
+        spans = list(dict.fromkeys(span for span in (entry.name, entry.full_name) if span))
+        matches = [(span, index.ground(span)) for span in spans]
+        if not any(match for _, match in matches):
+            unresolved.append(entry)
+            continue
+        for span, match in matches:
+            annotations.append(TextAnnotation(input_name=entry.name,
+                                              text=span,
+                                              cl_id=match[0] if match else NO_MATCH,
+                                              cl_label=match[1] if match else None))
+    logger.info(f"Pre-grounded {len(entries) - len(unresolved)} of {len(entries)} entries")
+    return annotations, unresolved
@@ -15,12 +15,15 @@ cell_logger.addHandler(console)
 cell_logger.propagate = False
 
 from .cell_config import  CellDependencies
-from .cell_tools import search_cl
+from .cell_tools import prepare_local_index_tool, search_cl_async, search_cl_batch, search_cl_similar, search_cl_variants
 
 CELL_SYSTEM_PROMPT = """
     You are an AI assistant that help Cell Ontology curators.
     You can use different functions to support curators in their tasks:
     - `search_cl` Search the cl ontology for a term.
+    - `search_cl_batch` Search the cl ontology for several terms in one call.
+    - `search_cl_variants` Search the cl ontology for a term and its singular, abbreviation-expanded and tissue-rewritten forms.
+    - `search_cl_similar` Find the cl terms most similar to several terms, with similarity scores (only with a local index).
 """
 
 cell_agent = Agent(
@@ -31,4 +34,7 @@ cell_agent = Agent(
     defer_model_check=True,
 )
 
-cell_agent.tool(search_cl)
\ No newline at end of file
+cell_agent.tool(search_cl_async, name="search_cl")
+cell_agent.tool(search_cl_batch)
+cell_agent.tool(search_cl_variants)
+cell_agent.tool(search_cl_similar, prepare=prepare_local_index_tool)
\ No newline at end of file
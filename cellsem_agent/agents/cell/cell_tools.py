@@ -1,12 +1,19 @@
 """
 Tools for the Cell agent.
 """
+import asyncio
 import os
 import logging
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 
-from oaklib import get_adapter
 from pydantic_ai import RunContext
+from pydantic_ai.tools import ToolDefinition
+
+from cellsem_agent.ontology.adapter_pool import get_search_executor
+from cellsem_agent.ontology.cl_index import normalize_term
+from cellsem_agent.ontology.query_variants import generate_variants
+from cellsem_agent.ontology.search_backends import get_local_index, get_search_backend, has_local_index
+from cellsem_agent.ontology.tfidf_index import ground_spans
 
 logger = logging.getLogger(__name__)
 
@@ -29,8 +36,107 @@ def search_cl(ctx: RunContext[str], term: str) -> List[Tuple[str, str]]:
     Returns:
         A list of tuples, each containing a CL ID and a label.
     """
-    adapter = get_adapter("ols:cl")
-    results = adapter.basic_search(term)
-    labels = list(adapter.labels(results))
+    labels = get_search_backend().search(term)
+    cl_index = get_local_index()
+    if not labels and cl_index is not None:
+        # near misses such as plurals or hyphenation differences
+        labels = [(term_id, label) for term_id, label, _ in cl_index.fuzzy_search(term)]
     print(f"## Query: {term} -> {labels}")
-    return labels
\ No newline at end of file
+    return labels
+
+
+async def search_cl_async(ctx: RunContext[str], term: str) -> List[Tuple[str, str]]:
+    """
+    Search the cl ontology for a term.
+
+    Note that search should take into account synonyms, but synonyms may be incomplete,
+    so if you cannot find a concept of interest, try searching using related or synonymous
+    terms.
+
+    If you are searching for a composite term, try searching on the sub-terms to get a sense
+    of the terminology used in the ontology.
+
+    Args:
+        ctx: The run context
+        term: The term to search for.
+
+    Returns:
+        A list of tuples, each containing a CL ID and a label.
+    """
+    # the blocking search runs on the shared executor so parallel tool calls overlap
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_search_executor(), search_cl, ctx, term)
+
+
+async def search_cl_batch(ctx: RunContext[str], terms: List[str]) -> Dict[str, List[Tuple[str, str]]]:
+    """
+    Search the cl ontology for several terms at once.
+
+    Prefer this over repeated `search_cl` calls when you have more than one span or
+    variant to look up (e.g. singular forms, synonyms, 'X Y' and 'Y of X' forms).
+
+    Args:
+        ctx: The run context
+        terms: The terms to search for.
+
+    Returns:
+        A mapping from each term to a list of tuples, each containing a CL ID and a label.
+    """
+    unique_terms: Dict[str, str] = {}
+    for term in terms:
+        unique_terms.setdefault(normalize_term(term), term)
+    results = await asyncio.gather(*(search_cl_async(ctx, term) for term in unique_terms.values()))
+    results_by_key = dict(zip(unique_terms, results))
+    return {term: results_by_key[normalize_term(term)] for term in terms}
+
+
+async def search_cl_variants(ctx: RunContext[str], text: str,
+                             tissue_context: Optional[str] = None) -> Dict[str, List[Tuple[str, str]]]:
+    """
+    Search the cl ontology for a text span and its common rewrites in one call.
+
+    The variants searched are the singular form, the span with known abbreviations expanded
+    (e.g. "SI_TA" -> "small intestine transit amplifying cell"), and the 'X Y' and 'Y of X'
+    forms where X is a tissue, including tissues from the tissue context.
+
+    Args:
+        ctx: The run context
+        text: The text span to search for.
+        tissue_context: Tissues where the cell type was identified, separated by semicolons.
+
+    Returns:
+        A mapping from each variant searched to a list of tuples, each containing a CL ID and a label.
+    """
+    return await search_cl_batch(ctx, generate_variants(text, tissue_context))
+
+
+async def search_cl_similar(ctx: RunContext[str], terms: List[str],
+                            k: int = 5) -> Dict[str, List[Tuple[str, str, float]]]:
+    """
+    Find the cl terms most similar to each of several terms, with a similarity score.
+
+    Similarity is computed over labels, synonyms and definitions, so this also finds terms
+    whose wording differs from the query. Use it when `search_cl` finds no direct match.
+
+    Args:
+        ctx: The run context
+        terms: The terms to search for.
+        k: Number of cl terms returned per term.
+
+    Returns:
+        A mapping from each term to a list of tuples, each containing a CL ID, a label and a score between 0 and 1.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        results = await loop.run_in_executor(get_search_executor(), ground_spans, terms, k)
+    except ValueError as e:
+        # no local index: an empty result sends the model back to search_cl instead of failing the run
+        logger.warning(f"search_cl_similar unavailable: {e}")
+        return {term: [] for term in terms}
+    print(f"## Similar: {terms} -> {results}")
+    return dict(zip(terms, results))
+
+
+async def prepare_local_index_tool(ctx: RunContext[str], tool_def: ToolDefinition) -> Optional[ToolDefinition]:
+    """Offer a tool to the model only when a local Cell Ontology index is configured."""
+    return tool_def if has_local_index() else None
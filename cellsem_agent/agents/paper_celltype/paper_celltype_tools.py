@@ -5,13 +5,22 @@ import os
 import logging
 import json
 from pathlib import Path
-from typing import Dict, Any, List
+from collections import Counter
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, Sequence, Tuple
 
-import fitz
 from pydantic_ai import RunContext
 
+from cellsem_agent.papers.abbreviations import expand_label, find_abbreviations, find_synonyms, with_cell_head_noun
+from cellsem_agent.papers.pdf_text import get_text
+
+if TYPE_CHECKING:
+    from cellsem_agent.agents.paper_celltype.paper_celltype_agent import CellTypeEntry
+
 logger = logging.getLogger(__name__)
 
+# Version of the prefill_entries rules, part of the paper expansion cache key
+PREFILL_RULES_VERSION = 2
+
 def get_full_text(ctx: RunContext[str], pdf_path: str) -> str:
     """
     Get the full text of a PDF file.
@@ -23,9 +32,7 @@ def get_full_text(ctx: RunContext[str], pdf_path: str) -> str:
     Returns:
         The full text of the PDF file.
     """
-    doc = fitz.open(pdf_path)
-    text = "\n".join(page.get_text("text") for page in doc)
-    return text
+    return get_text(pdf_path)
 
 def read_json(ctx: RunContext[str], file_path: str) -> List[Dict[str, Any]]:
     """
@@ -54,3 +61,105 @@ def read_json(ctx: RunContext[str], file_path: str) -> List[Dict[str, Any]]:
         raise ValueError(f"Invalid JSON format in file: {file_path}")
     except Exception as e:
         raise RuntimeError(f"Error reading JSON file {file_path}: {e}")
+
+
+def _join_unique(values: Sequence[Optional[str]]) -> Optional[str]:
+    """Join the distinct semicolon separated items of several values, keeping the first spelling seen."""
+    items: Dict[str, str] = {}
+    for value in values:
+        for item in (value or "").split(";"):
+            item = item.strip()
+            if item:
+                items.setdefault(item.casefold(), item)
+    return "; ".join(items.values()) or None
+
+
+def merge_entries(results: Sequence[List["CellTypeEntry"]], texts: Sequence[str],
+                  labels: Sequence[str]) -> List["CellTypeEntry"]:
+    """
+    Merge the cell type entries extracted from several chunks of a paper into one entry per label.
+
+    Synonyms and tissue contexts are the union of all chunks. The full name is the one found
+    verbatim in the text of the chunk it came from (an explicit definition) if any, then the one
+    given by the most chunks, then the one from the earliest chunk.
+
+    Args:
+        results: The entries extracted from each chunk.
+        texts: The text of each chunk, in the same order.
+        labels: The cc.labels, giving the order of the merged entries.
+
+    Returns:
+        The merged entries, in label order followed by any other names in the order first seen.
+    """
+    from .paper_celltype_agent import CellTypeEntry
+
+    grouped: Dict[str, List[tuple]] = {name: [] for name in labels}
+    for chunk, (entries, text) in enumerate(zip(results, texts)):
+        folded_text = text.casefold()
+        for entry in entries:
+            grouped.setdefault(entry.name, []).append((chunk, entry, folded_text))
+
+    merged = []
+    for name, found in grouped.items():
+        if not found:
+            continue
+        full_names = [(chunk, entry.full_name.strip(), entry.full_name.strip().casefold() in text)
+                      for chunk, entry, text in found if entry.full_name and entry.full_name.strip()]
+        counts = Counter(full_name.casefold() for _, full_name, _ in full_names)
+        full_name = None
+        if full_names:
+            _, full_name, _ = min(full_names, key=lambda item: (not item[2], -counts[item[1].casefold()], item[0]))
+        merged.append(CellTypeEntry(
+            name=name,
+            full_name=full_name,
+            paper_synonyms=_join_unique([entry.paper_synonyms for _, entry, _ in found]),
+            tissue_context=_join_unique([entry.tissue_context for _, entry, _ in found])))
+    return merged
+
+
+def prefill_entries(cc_labels_data: List[Dict[str, Any]],
+                    texts: Sequence[str]) -> Tuple[List["CellTypeEntry"], List[Dict[str, Any]]]:
+    """
+    Fill in the cell type entries whose labels can be expanded with the abbreviations defined in a paper.
+
+    The full name is the label expanded with `expand_label`, ending in a cell head noun (see
+    `with_cell_head_noun`), the synonyms are the short forms
+    and "also known as" style names of that full name, and the tissue context lists the
+    dissection tissues of the label that the paper mentions.
+
+    Args:
+        cc_labels_data: The rows of the labels JSON.
+        texts: The texts of the paper and its supplementary material.
+
+    Returns:
+        The pre-filled entries and the rows that still need the agent.
+    """
+    from .paper_celltype_agent import CellTypeEntry
+
+    text = " ".join(" ".join(texts).split())
+    folded_text = text.casefold()
+    abbreviations = find_abbreviations(text)
+    synonym_pairs = find_synonyms(text)
+    entries = []
+    leftovers = []
+    for row in cc_labels_data:
+        full_name = expand_label(row["cc.label"], abbreviations)
+        if full_name is None:
+            leftovers.append(row)
+            continue
+        # the label names a cell type even when its abbreviations expand to e.g. "transit amplifying"
+        folded_names = {full_name.casefold(), with_cell_head_noun(full_name).casefold()}
+        full_name = with_cell_head_noun(full_name)
+        synonyms = [short_form for short_form, long_form in abbreviations.items()
+                    if long_form.casefold() in folded_names]
+        for term, synonym in synonym_pairs:
+            if term.casefold() in folded_names:
+                synonyms.append(synonym)
+            elif synonym.casefold() in folded_names:
+                synonyms.append(term)
+        tissues = [dissection["label"] for dissection in row.get("disssections", [])
+                   if dissection.get("label") and dissection["label"].casefold() in folded_text]
+        entries.append(CellTypeEntry(name=row["cc.label"], full_name=full_name,
+                                     paper_synonyms=_join_unique(synonyms),
+                                     tissue_context=_join_unique(tissues)))
+    return entries, leftovers
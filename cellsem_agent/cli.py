@@ -103,6 +103,62 @@ def paperqaa(ui, query, **kwargs):
     print(f"Running PaperQA with query: {query} and UI: {ui}")
     run_agent("paperqa", "aurelian.agents.paperqa", query=query, ui=ui, **kwargs)
 
+@main.group(name="search-cache")
+def search_cache():
+    """Inspect or clear the persistent Cell Ontology search cache."""
+
+
+@search_cache.command(name="info")
+def search_cache_info():
+    """Show the location, size and hit/miss counters of the search cache."""
+    from cellsem_agent.ontology.search_backends import get_search_cache
+
+    stats = get_search_cache().stats()
+    lookups = stats["hits"] + stats["misses"]
+    for key, value in stats.items():
+        print(f"{key}: {value}")
+    if lookups:
+        print(f"hit_rate: {stats['hits'] / lookups:.1%}")
+
+
+@search_cache.command(name="clear")
+@click.option("--expired-only", is_flag=True, default=False, help="Only remove entries past their TTL.")
+def search_cache_clear(expired_only):
+    """Remove entries from the search cache."""
+    from cellsem_agent.ontology.search_backends import get_search_cache
+
+    cache = get_search_cache()
+    if expired_only:
+        print(f"Removed {cache.purge_expired()} expired entries from {cache.path}")
+    else:
+        cache.clear()
+        print(f"Cleared {cache.path}")
+
+@main.command(name="cxg-annotate")
+@click.option("--datasets-dir", type=click.Path(exists=True, file_okay=False), envvar="CXG_DATASETS_DIR",
+              help="Directory of dataset folders, with an optional datasets.json manifest.")
+@click.option("--dataset", "dataset_names", multiple=True,
+              help="Dataset name or glob pattern to process; repeat for several. All datasets by default.")
+@click.option("--test-mode", is_flag=True, default=False, help="Only process the first dataset.")
+@click.option("--list", "list_only", is_flag=True, default=False,
+              help="List the selected datasets in processing order and exit.")
+@click.option("--parquet-dir", type=click.Path(file_okay=False), envvar="CXG_PARQUET_DIR",
+              help="Also write the annotations as per-dataset partitions of a Parquet dataset (needs pyarrow).")
+def cxg_annotate(datasets_dir, dataset_names, test_mode, list_only, parquet_dir):
+    """Expand and ground the cell type labels of CellxGene datasets."""
+    import asyncio
+
+    from cellsem_agent.graphs.cxg_annotate import cxg_annotate_graph
+    from cellsem_agent.graphs.cxg_annotate.datasets import estimate_cost, load_datasets, schedule
+
+    datasets_dir = datasets_dir or cxg_annotate_graph.DATASETS_DIR
+    if list_only:
+        for dataset in schedule(datasets_dir, load_datasets(datasets_dir, dataset_names)):
+            print(f"{dataset.name}\t~{estimate_cost(datasets_dir, dataset)} tokens")
+        return
+    asyncio.run(cxg_annotate_graph.main(datasets_dir=datasets_dir, dataset_names=list(dataset_names) or None,
+                                        is_test_mode=test_mode, parquet_dir=parquet_dir))
+
 # Import and register PaperQA CLI commands
 from aurelian.agents.paperqa.paperqa_cli import paperqa_cli
 main.add_command(paperqa_cli)
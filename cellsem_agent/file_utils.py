@@ -1,4 +1,6 @@
 import csv
+import hashlib
+import os
 
 
 def tsv_to_string(tsv):
@@ -26,3 +28,26 @@ def tsv_to_md_table(tsv):
             md_table = "\n".join([header, separator, body])
     print("TSV as Markdown table:\n" + md_table)
     return md_table
+
+
+def get_cache_dir(*parts, create=True):
+    """
+    Return (and by default create) a directory under the shared cellsem-agent cache.
+
+    The cache root is taken from the CELLSEM_CACHE_DIR environment variable and
+    defaults to ~/.cache/cellsem_agent.
+    """
+    root = os.environ.get("CELLSEM_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "cellsem_agent"))
+    path = os.path.join(root, *parts)
+    if create:
+        os.makedirs(path, exist_ok=True)
+    return path
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """Return the hex SHA-256 digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -1,17 +1,20 @@
 import asyncio
 import os.path
-import subprocess
 import re
 import json
 import copy
 import random
 import pandas as pd
+from typing import Awaitable, Optional
 
 from dotenv import load_dotenv
 from pydantic_graph import BaseNode, End, Graph, GraphRunContext
 
 from aurelian.agents.paperqa.paperqa_agent import paperqa_agent
 from cellsem_agent.agents.cell.cell_agent import cell_agent
+from cellsem_agent.graphs.cl_validation.paperqa_pool import (NoDocumentsError, get_paperqa_pool, has_documents,
+                                                            index_is_current, shutdown_paperqa_pool)
+from cellsem_agent.graphs.cl_validation.reference_store import ReferenceStore
 
 
 from dataclasses import dataclass
@@ -44,6 +47,18 @@ OUT_FOLDER = os.path.join(CELL_DATA_DIR, "output")
 os.makedirs(OUT_FOLDER, exist_ok=True)
 CL_FALSE_DEFINITIONS_FILE = os.path.join(OUT_FOLDER, "cells_false_data.json")
 FALSE_ASSERTION_PROBABILITY = 0.6  # Probability of generating a false assertion
+# Reference folders indexed at once, bounded by the PaperQA workers and the embedding API rate limit
+MAX_CONCURRENT_INDEXING = 4
+# Cell types validated at once
+MAX_CONCURRENT_ASSERTIONS = 4
+# Seconds a worker spends on one PaperQA answer before cancelling it, and the attempts made after a failure or time out
+ASSERTION_TIMEOUT = 900
+ASSERTION_RETRIES = 2
+RETRY_BACKOFF = 10  # seconds, doubled after every attempt
+# Parse and embed each reference document once into a store shared by all CL terms, instead of one index per term.
+# Opt-in: answers from the stored documents skip the agent's paper search and are not yet compared with the index ones
+SHARED_REFERENCE_STORE = False
+REFERENCE_STORE_DIR = os.path.join(REFERENCES_DATA_DIR, ".shared")
 
 @dataclass
 class CellTypeInfo:
@@ -132,24 +147,100 @@ class PaperQAAssertions(BaseNode[State, None, str]):
 
     async def run(self, ctx: GraphRunContext[State]) -> GenerateReport:
         definitions = ctx.state.cl_updated_definitions
-        # pqa_output_folder = os.path.join(OUT_FOLDER, "paperqa")
-        for cell_type in definitions:
+        # no more questions than workers, so that a question never waits for a worker
+        semaphore = asyncio.Semaphore(min(MAX_CONCURRENT_ASSERTIONS, get_paperqa_pool().max_workers))
+
+        async def validate(cell_type: CellTypeInfo) -> str:
             pqa_output = os.path.join(OUT_FOLDER, cell_type.cl_id + ".md")
-            if not os.path.exists(pqa_output):
-                cell_ref_folder = os.path.join(REFERENCES_DATA_DIR, cell_type.cl_id)
-                paperqa_index_folder(cell_ref_folder)
-                result = paperqa_ask_assertions(cell_type, cell_ref_folder)
-                print("PaperQA result: " + result)
-                write_txt_file(pqa_output, result)
+            if os.path.exists(pqa_output):
+                return read_txt_file(pqa_output)
+            async with semaphore:
+                result = await self.ask_with_retries(cell_type)
+            cl_validation_logger.info("PaperQA result: " + result)
+            write_txt_file(pqa_output, result)
+            return result
+
+        # results are kept in definition order; completed answers are written even if others fail
+        results = await asyncio.gather(*(validate(cell_type) for cell_type in definitions), return_exceptions=True)
+        errors = list()
+        for cell_type, result in zip(definitions, results):
+            if isinstance(result, BaseException):
+                cl_validation_logger.error(f"Failed to validate {cell_type.cl_id}: {result}")
+                errors.append(result)
             else:
-                result = read_txt_file(pqa_output)
-            ctx.state.paperqa_result.append(PaperQAResult(cell_type=cell_type, result=result))
+                ctx.state.paperqa_result.append(PaperQAResult(cell_type=cell_type, result=result))
+        if errors:
+            raise errors[0]
         return GenerateReport()
 
+    async def ask_with_retries(self, cell_type: CellTypeInfo) -> str:
+        cell_ref_folder = os.path.join(REFERENCES_DATA_DIR, cell_type.cl_id)
+        attempt = 0
+        while True:
+            try:
+                await paperqa_index_folder(cell_ref_folder)
+                return await paperqa_ask_assertions(cell_type, cell_ref_folder, timeout=ASSERTION_TIMEOUT)
+            except NoDocumentsError:
+                raise
+            except Exception as e:
+                if attempt == ASSERTION_RETRIES:
+                    raise
+                delay = RETRY_BACKOFF * 2 ** attempt
+                cl_validation_logger.warning(f"Attempt {attempt + 1} for {cell_type.cl_id} failed ({e!r}), retrying in {delay}s")
+                await asyncio.sleep(delay)
+                attempt += 1
+
 @dataclass
-class SeedNegativeTests(BaseNode[State, None, str]):
+class IndexReferences(BaseNode[State, None, str]):
+    """
+    Builds the missing reference indexes, or shared store documents, of the cell types to
+    validate concurrently, so that PaperQAAssertions only has to ask.
+    """
 
     async def run(self, ctx: GraphRunContext[State]) -> PaperQAAssertions:
+        folders = list()
+        for cell_type in ctx.state.cl_updated_definitions:
+            if os.path.exists(os.path.join(OUT_FOLDER, cell_type.cl_id + ".md")):
+                continue
+            cell_ref_folder = os.path.join(REFERENCES_DATA_DIR, cell_type.cl_id)
+            if not has_documents(cell_ref_folder):
+                cl_validation_logger.warning(f"No reference documents found in {cell_ref_folder}")
+            elif cell_ref_folder not in folders:
+                folders.append(cell_ref_folder)
+        if SHARED_REFERENCE_STORE:
+            # a document shared by several folders is parsed and embedded once
+            store = get_reference_store()
+            jobs = [(path, store_reference_document(store, key, path)) for key, path in store.missing(folders).items()]
+            unit = "shared reference documents"
+        else:
+            jobs = [(folder, paperqa_index_folder(folder)) for folder in folders if needs_index(folder)]
+            unit = "reference folders"
+        if not jobs:
+            return PaperQAAssertions()
+
+        pool = get_paperqa_pool()
+        semaphore = asyncio.Semaphore(min(MAX_CONCURRENT_INDEXING, pool.max_workers))
+        done = 0
+
+        async def index(job: Awaitable[None]) -> None:
+            nonlocal done
+            async with semaphore:
+                try:
+                    await job
+                finally:
+                    done += 1
+                    cl_validation_logger.info(f"Indexed {done}/{len(jobs)} {unit}")
+
+        results = await asyncio.gather(*(index(job) for _, job in jobs), return_exceptions=True)
+        for (path, _), result in zip(jobs, results):
+            if isinstance(result, Exception):
+                cl_validation_logger.error(f"Failed to index {path}: {result}")
+        return PaperQAAssertions()
+
+@dataclass
+class SeedNegativeTests(BaseNode[State, None, str]):
+
+    async def run(self, ctx: GraphRunContext[State]) -> IndexReferences:
         definitions = ctx.state.cl_definitions
         test_definitions = list()
         false_assertions= list()
@@ -171,7 +262,7 @@ class SeedNegativeTests(BaseNode[State, None, str]):
         ctx.state.cl_updated_definitions.extend(test_definitions)
 
         write_json_file(CL_FALSE_DEFINITIONS_FILE, false_assertions)
-        return PaperQAAssertions()
+        return IndexReferences()
 
     async def ask_agent_for_false_definition(self, definition, false_assertions):
         prompt = (
@@ -227,9 +318,9 @@ def write_txt_file(path, data):
     with open(path, 'w') as f:
         f.write(data)
 
-def paperqa_ask_assertions(cell_type_info: CellTypeInfo, cell_references_path: str) -> str:
+def assertions_prompt(cell_type_info: CellTypeInfo) -> str:
     logical_assertions = "\n".join([ct.strip() for ct in cell_type_info.logical_axioms.split(".")])
-    paperqa_prompt = ("""
+    return ("""
                         For the following text, first break down the definition into individual, atomic assertions. Each assertion should be a single, verifiable statement. After extracting the assertions, create a table with the following columns:
                     
                         - **Assertion**: A single, verifiable statement about the cell type.
@@ -239,47 +330,55 @@ def paperqa_ask_assertions(cell_type_info: CellTypeInfo, cell_references_path: s
                         
                         Text:
                         """
-                      f"name: {cell_type_info.name} \n"
-                      f"def: \"{cell_type_info.definition}\" \n"
-                      f"{logical_assertions}")
-    command = [
-        "poetry", "run", "cellsem-agent", "paperqa", "ask",
-        paperqa_prompt,
-        "-d", os.path.abspath(cell_references_path)
-    ]
-    result = subprocess.run(command, capture_output=True, text=True)
-    if result.returncode != 0:
-        print(result.stderr)
-        raise RuntimeError(f"Command failed: {result.stderr}")
-    elif result.stderr:
-        print("Warning: " + result.stderr)
-    ppqa_log = result.stdout
-    idx = ppqa_log.rfind("Answer:")
-    if idx == -1:
-        raise ValueError("No 'Answer:' found in the output text: " + ppqa_log)
-    ppqa_result = ppqa_log[idx + len("Answer:"):].strip()
-    return ppqa_result
-
-def paperqa_index_folder(path):
-    pqa_folder = os.path.join(path, ".pqa")
-    if os.path.exists(pqa_folder) and os.path.isdir(pqa_folder):
-        cl_validation_logger.info(f"Index already exists at {pqa_folder}, skipping indexing.")
+            f"name: {cell_type_info.name} \n"
+            f"def: \"{cell_type_info.definition}\" \n"
+            f"{logical_assertions}")
+
+async def paperqa_ask_assertions(cell_type_info: CellTypeInfo, cell_references_path: str,
+                                 timeout: Optional[float] = None) -> str:
+    if SHARED_REFERENCE_STORE:
+        store_paths = get_reference_store().view(cell_references_path)
+        answer = await get_paperqa_pool().ask_documents(assertions_prompt(cell_type_info), store_paths, timeout=timeout)
+    else:
+        answer = await get_paperqa_pool().ask(assertions_prompt(cell_type_info), cell_references_path, timeout=timeout)
+    cl_validation_logger.info(f"PaperQA answered for {cell_type_info.cl_id} (cost ${answer.cost:.4f})")
+    return answer.to_text()
+
+_reference_store: Optional[ReferenceStore] = None
+
+def get_reference_store() -> ReferenceStore:
+    global _reference_store
+    if _reference_store is None:
+        _reference_store = ReferenceStore(REFERENCE_STORE_DIR)
+    return _reference_store
+
+async def store_reference_document(store: ReferenceStore, key: str, path: str) -> None:
+    docname = await get_paperqa_pool().store_document(path, store.path(key))
+    cl_validation_logger.info(f"Stored {path} as {docname} ({key})")
+
+def needs_index(path: str) -> bool:
+    if SHARED_REFERENCE_STORE:
+        return bool(get_reference_store().missing([path]))
+    return not index_is_current(path)
+
+async def paperqa_index_folder(path: str) -> None:
+    if SHARED_REFERENCE_STORE:
+        for key, document_path in get_reference_store().missing([path]).items():
+            await store_reference_document(get_reference_store(), key, document_path)
+        return
+    if not needs_index(path):
+        cl_validation_logger.info(f"Index of {path} is up to date, skipping indexing.")
         return
-    command = [
-        "poetry", "run", "cellsem-agent", "paperqa", "--verbose", "index",
-        "-d", os.path.abspath(path)
-    ]
-    result = subprocess.run(command, capture_output=True, text=True)
-    if result.returncode != 0:
-        print(result.stderr)
-        raise RuntimeError(f"Command failed: {result.stderr}")
-    elif result.stderr:
-        print("Warning: " + result.stderr)
+    indexed = await get_paperqa_pool().index(path)
+    cl_validation_logger.info(f"Indexed {indexed} documents in {path}")
 
 async def main():
     state = State(list(), list(), list(), is_test_mode=IS_TEST_MODE)
-    validation_graph = Graph(nodes=(GetCLDefinitions, SeedNegativeTests, PaperQAAssertions, GenerateReport))
-    result = await validation_graph.run(GetCLDefinitions(), state=state)
+    validation_graph = Graph(nodes=(GetCLDefinitions, SeedNegativeTests, IndexReferences, PaperQAAssertions, GenerateReport))
+    try:
+        result = await validation_graph.run(GetCLDefinitions(), state=state)
+    finally:
+        shutdown_paperqa_pool()
     print(result.output)
     # print(validation_graph.mermaid_code())
 
@@ -0,0 +1,326 @@
+"""
+Long-lived worker processes answering PaperQA questions over reference folders.
+
+Each worker imports the paperqa stack once and keeps an event loop, the settings of the
+folders it has seen and paperqa's opened search indexes for its whole life, so a question
+only pays for the LLM calls it makes.
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from cellsem_agent.file_utils import file_sha256
+
+logger = logging.getLogger(__name__)
+
+# Number of worker processes, overridden with the PAPERQA_WORKERS environment variable
+PAPERQA_WORKERS = int(os.environ.get("PAPERQA_WORKERS", min(4, os.cpu_count() or 1)))
+# File types paperqa indexes
+DOCUMENT_EXTENSIONS = (".pdf", ".txt", ".html", ".md")
+INDEX_FOLDER_NAME = ".pqa"
+# Content hashes of the documents last indexed, in the index folder
+HASH_MANIFEST_FILE_NAME = "file_hashes.json"
+
+
+class NoDocumentsError(ValueError):
+    """A folder or view has no documents to index or answer from, which retrying does not fix."""
+
+
+@dataclass
+class PaperQAAnswer:
+    answer: str
+    references: str
+    cost: float = 0.0
+
+    def to_text(self) -> str:
+        """Format the answer as the `paperqa ask` command prints it."""
+        return f"{self.answer}\n\nReferences: {self.references}"
+
+
+# Worker process state, set by _init_worker
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_settings: Dict[Optional[str], object] = {}
+
+
+def _init_worker() -> None:
+    global _loop
+    # import the heavy stack once per process rather than once per question
+    import aurelian.agents.paperqa.paperqa_config  # noqa: F401
+    import paperqa.agents.search  # noqa: F401
+    _loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_loop)
+
+
+def has_documents(folder: str) -> bool:
+    """Tell whether a folder holds documents paperqa can index."""
+    return os.path.isdir(folder) and any(
+        name.lower().endswith(DOCUMENT_EXTENSIONS) for name in os.listdir(folder))
+
+
+def document_hashes(folder: str) -> Dict[str, str]:
+    """Get the SHA-256 of the indexable documents of a folder, by file name."""
+    return {name: file_sha256(os.path.join(folder, name)) for name in sorted(os.listdir(folder))
+            if name.lower().endswith(DOCUMENT_EXTENSIONS) and os.path.isfile(os.path.join(folder, name))}
+
+
+def _manifest_path(folder: str) -> str:
+    return os.path.join(folder, INDEX_FOLDER_NAME, HASH_MANIFEST_FILE_NAME)
+
+
+def read_hash_manifest(folder: str) -> Optional[Dict[str, str]]:
+    """Read the document hashes recorded at the last indexing of a folder, None if it has none."""
+    path = _manifest_path(folder)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_hash_manifest(folder: str, hashes: Dict[str, str]) -> None:
+    path = _manifest_path(folder)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(hashes, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def index_is_current(folder: str) -> bool:
+    """Tell whether the index of a folder holds exactly its current documents."""
+    return read_hash_manifest(folder) == document_hashes(folder)
+
+
+def _base_settings() -> Any:
+    """Build the paperqa settings of `cellsem-agent paperqa`, without a paper directory."""
+    if None not in _settings:
+        from aurelian.agents.paperqa.paperqa_config import get_config
+
+        _settings[None] = get_config().set_paperqa_settings()
+    return _settings[None]
+
+
+def _folder_settings(folder: str) -> Any:
+    """
+    Build the paperqa settings of a reference folder like `cellsem-agent paperqa` does, with the
+    index stored in the `.pqa` sub folder.
+    """
+    if folder not in _settings:
+        from aurelian.agents.paperqa.paperqa_config import get_config
+        from paperqa.settings import IndexSettings
+
+        config = get_config()
+        config.paper_directory = folder
+        settings = config.set_paperqa_settings()
+        settings.agent.index = IndexSettings(
+            name=config.index_name,
+            paper_directory=folder,
+            index_directory=os.path.join(folder, INDEX_FOLDER_NAME, "indexes"),
+            recurse_subdirectories=False,
+        )
+        _settings[folder] = settings
+    return _settings[folder]
+
+
+async def _index_folder(folder: str, changed: List[str]) -> int:
+    from paperqa.agents.search import get_directory_index
+
+    settings = _folder_settings(folder)
+    if changed:
+        # paperqa only checks file names, so changed documents are dropped to be indexed again
+        try:
+            search_index = await get_directory_index(settings=settings, build=False)
+        except RuntimeError:
+            # empty index, nothing to drop
+            search_index = None
+        if search_index is not None:
+            for name in changed:
+                await search_index.remove_from_index(name)
+            if search_index.changed:
+                await search_index.save_index()
+    # adds the new and changed documents and drops the removed ones
+    search_index = await get_directory_index(settings=settings, build=True)
+    return len(await search_index.index_files)
+
+
+async def _ask(query: str, folder: str) -> PaperQAAnswer:
+    from paperqa import agent_query
+
+    response = await agent_query(query=query, settings=_folder_settings(folder))
+    session = response.session
+    return PaperQAAnswer(answer=session.answer, references=session.references, cost=session.cost)
+
+
+async def _store_document(source_path: str, store_path: str) -> str:
+    from paperqa import Docs
+
+    docs = Docs()
+    await docs.aadd(source_path, settings=_base_settings())
+    if not docs.docs:
+        raise ValueError(f"paperqa did not add {source_path}")
+    doc = next(iter(docs.docs.values()))
+    with open(store_path + ".tmp", 'wb') as f:
+        pickle.dump({"doc": doc, "texts": docs.texts}, f)
+    os.replace(store_path + ".tmp", store_path)
+    return doc.docname
+
+
+async def _ask_documents(query: str, store_paths: List[str]) -> PaperQAAnswer:
+    from paperqa import Docs
+
+    settings = _base_settings()
+    docs = Docs()
+    for path in store_paths:
+        with open(path, 'rb') as f:
+            stored = pickle.load(f)
+        # the texts keep their embeddings, so nothing is embedded again
+        await docs.aadd_texts(stored["texts"], stored["doc"], settings=settings)
+    session = await docs.aquery(query, settings=settings)
+    return PaperQAAnswer(answer=session.answer, references=session.references, cost=session.cost)
+
+
+def _run(timeout: Optional[float], coroutine_function: Callable, *args: Any) -> Any:
+    if _loop is None:
+        raise RuntimeError("PaperQA jobs run in worker processes started by PaperQAPool")
+    # the time out runs in the worker, so it starts with the job and cancelling the job frees the worker
+    return _loop.run_until_complete(asyncio.wait_for(coroutine_function(*args), timeout))
+
+
+class PaperQAPool:
+    """
+    Pool of PaperQA worker processes.
+
+    Workers are started with the "spawn" method so they do not inherit the event loop and
+    clients of the calling process. A worker dying breaks the whole executor, which is then
+    replaced so that the failed job can be retried.
+    """
+
+    def __init__(self, max_workers: int = PAPERQA_WORKERS):
+        self.max_workers = max_workers
+        self._executor = self._new_executor()
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker,
+                                   mp_context=multiprocessing.get_context("spawn"))
+
+    async def _submit(self, timeout: Optional[float], coroutine_function: Callable, *args: Any) -> Any:
+        executor = self._executor
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(executor, _run, timeout, coroutine_function, *args)
+        except BrokenProcessPool:
+            # the concurrent jobs fail with the same executor, only the first one replaces it
+            if executor is self._executor:
+                logger.warning("A PaperQA worker died, restarting the workers")
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = self._new_executor()
+            raise
+
+    async def index(self, folder: str) -> int:
+        """
+        Build or update the index of a reference folder.
+
+        Only the delta since the last indexing is processed: documents are compared with the
+        content hashes recorded in the index folder, new and changed ones are indexed and
+        removed ones are dropped. An index built without hashes is assumed to be up to date for
+        the documents it already has.
+
+        Args:
+            folder: The folder holding the reference documents.
+
+        Returns:
+            The number of indexed documents.
+        """
+        folder = os.path.abspath(folder)
+        if not has_documents(folder):
+            raise NoDocumentsError(f"No indexable documents found in {folder}")
+        hashes = document_hashes(folder)
+        indexed = read_hash_manifest(folder) or {}
+        changed = [name for name, sha in hashes.items() if name in indexed and indexed[name] != sha]
+        new = [name for name in hashes if name not in indexed]
+        removed = [name for name in indexed if name not in hashes]
+        logger.info(f"Indexing {folder}: {len(new)} new, {len(changed)} changed, {len(removed)} removed documents")
+        count = await self._submit(None, _index_folder, folder, changed)
+        # the hashes read before indexing, so a document changed meanwhile is indexed again next time
+        write_hash_manifest(folder, hashes)
+        return count
+
+    async def ask(self, query: str, folder: str, timeout: Optional[float] = None) -> PaperQAAnswer:
+        """
+        Ask a question about the indexed documents of a reference folder.
+
+        Args:
+            query: The question.
+            folder: The folder holding the reference documents.
+            timeout: Seconds a worker spends on the question before cancelling it and raising
+                TimeoutError, None for no limit.
+
+        Returns:
+            The answer and its references.
+        """
+        folder = os.path.abspath(folder)
+        if not has_documents(folder):
+            raise NoDocumentsError(f"No indexable documents found in {folder}")
+        return await self._submit(timeout, _ask, query, folder)
+
+    async def store_document(self, source_path: str, store_path: str) -> str:
+        """
+        Parse and embed a document once and save its chunks to a reference store file.
+
+        Args:
+            source_path: The document.
+            store_path: The file written, see `ReferenceStore.path`.
+
+        Returns:
+            The name paperqa gave the document.
+        """
+        return await self._submit(None, _store_document, source_path, store_path)
+
+    async def ask_documents(self, query: str, store_paths: List[str],
+                            timeout: Optional[float] = None) -> PaperQAAnswer:
+        """
+        Ask a question about a selection of stored documents, e.g. the view of a CL term.
+
+        The question is answered from the evidence of these documents only, without the agent
+        searching a paper index.
+
+        Args:
+            query: The question.
+            store_paths: The reference store files of the documents.
+            timeout: Seconds a worker spends on the question before cancelling it and raising
+                TimeoutError, None for no limit.
+
+        Returns:
+            The answer and its references.
+        """
+        if not store_paths:
+            raise NoDocumentsError("No stored documents to answer from")
+        return await self._submit(timeout, _ask_documents, query, list(store_paths))
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+_pool: Optional[PaperQAPool] = None
+
+
+def get_paperqa_pool() -> PaperQAPool:
+    """Get the pool shared by the graph nodes, starting it on first use."""
+    global _pool
+    if _pool is None:
+        _pool = PaperQAPool()
+        logger.info(f"Started {_pool.max_workers} PaperQA workers")
+    return _pool
+
+
+def shutdown_paperqa_pool() -> None:
+    """Stop the shared pool, if it was started."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
@@ -0,0 +1,75 @@
+"""
+Content addressed store of parsed and embedded reference documents, shared by all CL terms.
+
+A document cited by several terms is stored once, keyed by the SHA-256 of its content and the
+parsing and embedding settings; the reference folder of a term only selects which stored
+documents its questions are answered from.
+"""
+import hashlib
+import logging
+import os
+from typing import Dict, List, Optional, Sequence
+
+from cellsem_agent.file_utils import file_sha256
+from cellsem_agent.graphs.cl_validation.paperqa_pool import DOCUMENT_EXTENSIONS
+
+logger = logging.getLogger(__name__)
+
+STORE_FILE_EXTENSION = ".pkl"
+
+
+def settings_fingerprint() -> str:
+    """Fingerprint of the paperqa settings the stored chunks and embeddings depend on."""
+    from aurelian.agents.paperqa.paperqa_config import get_config
+
+    config = get_config()
+    return hashlib.sha256(f"{config.embedding}|{config.chunk_size}|{config.overlap}".encode()).hexdigest()[:12]
+
+
+class ReferenceStore:
+
+    def __init__(self, store_dir: str, fingerprint: Optional[str] = None):
+        self.store_dir = store_dir
+        self.fingerprint = fingerprint or settings_fingerprint()
+        os.makedirs(store_dir, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.store_dir, key + STORE_FILE_EXTENSION)
+
+    def documents(self, folder: str) -> Dict[str, str]:
+        """
+        Get the store keys of the documents of a reference folder.
+
+        Args:
+            folder: The reference folder of a CL term.
+
+        Returns:
+            The path of each document, by store key.
+        """
+        documents: Dict[str, str] = {}
+        if not os.path.isdir(folder):
+            return documents
+        for name in sorted(os.listdir(folder)):
+            path = os.path.join(folder, name)
+            if name.lower().endswith(DOCUMENT_EXTENSIONS) and os.path.isfile(path):
+                documents.setdefault(f"{file_sha256(path)}-{self.fingerprint}", path)
+        return documents
+
+    def missing(self, folders: Sequence[str]) -> Dict[str, str]:
+        """
+        Get the documents of reference folders that are not stored yet, each once however many
+        folders hold it.
+
+        Returns:
+            The path of one copy of each missing document, by store key.
+        """
+        missing = {}
+        for folder in folders:
+            for key, path in self.documents(folder).items():
+                if key not in missing and not os.path.exists(self.path(key)):
+                    missing[key] = path
+        return missing
+
+    def view(self, folder: str) -> List[str]:
+        """Get the stored files of the documents of a reference folder, the view its questions use."""
+        return [self.path(key) for key in self.documents(folder)]
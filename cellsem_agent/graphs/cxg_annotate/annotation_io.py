@@ -0,0 +1,97 @@
+"""
+Filtering and writing of the annotations of a dataset.
+"""
+import importlib.util
+import logging
+import os
+from typing import Optional
+from urllib.parse import quote
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+UNFILTERED_TSV = "cell_type_annotations_un_filtered.tsv"
+FILTERED_TSV = "cell_type_annotations.tsv"
+PARQUET_FILE_NAME = "part-0.parquet"
+
+
+def filter_annotations(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Keep the annotations with a CL term, once per input name and term.
+
+    Rows without a CL id, such as "NO MATCH found", are dropped and duplicate
+    (input_name, cl_id) pairs keep their first row. The input frame is not modified.
+
+    Args:
+        df: Annotations with `input_name` and `cl_id` columns.
+
+    Returns:
+        The kept rows in their original order, with a fresh index.
+    """
+    if df.empty:
+        return df.copy()
+    return df[_selected_mask(df)].reset_index(drop=True)
+
+
+def _selected_mask(df: pd.DataFrame) -> pd.Series:
+    return df['cl_id'].str.startswith('CL:', na=False) & ~df.duplicated(subset=['input_name', 'cl_id'], keep='first')
+
+
+def write_tsvs(dataset_folder: str, df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Write the unfiltered and filtered annotation TSVs of a dataset.
+
+    Returns:
+        The filtered annotations.
+    """
+    filtered_df = filter_annotations(df)
+    df.to_csv(os.path.join(dataset_folder, UNFILTERED_TSV), sep='\t', index=False)
+    filtered_df.to_csv(os.path.join(dataset_folder, FILTERED_TSV), sep='\t', index=False)
+    return filtered_df
+
+
+def write_parquet_partition(parquet_dir: str, dataset_name: str, df: pd.DataFrame) -> str:
+    """
+    Write the annotations of a dataset as its partition of a Parquet dataset.
+
+    Partitions are hive style folders (`dataset=<name>`), so rewriting a dataset leaves the others
+    untouched and `read_parquet_annotations` scans all of them at once. Rows kept by
+    `filter_annotations` have `selected` set.
+
+    Args:
+        parquet_dir: Root folder of the Parquet dataset.
+        dataset_name: The dataset, i.e. the partition written.
+        df: The unfiltered annotations.
+
+    Returns:
+        The path of the written file.
+    """
+    if importlib.util.find_spec("pyarrow") is None:
+        raise ImportError("Writing Parquet annotations requires pyarrow, install the `parquet` extra with "
+                          "`pip install cellsem_agent[parquet]`.")
+    partition = os.path.join(parquet_dir, f"dataset={quote(dataset_name, safe='')}")
+    os.makedirs(partition, exist_ok=True)
+    table = df.copy()
+    if not table.empty:
+        table['selected'] = _selected_mask(df)
+    path = os.path.join(partition, PARQUET_FILE_NAME)
+    table.to_parquet(path, index=False)
+    return path
+
+
+def read_parquet_annotations(parquet_dir: str, selected_only: bool = False,
+                             columns: Optional[list] = None) -> pd.DataFrame:
+    """
+    Read the annotations of all datasets written by `write_parquet_partition`.
+
+    Args:
+        parquet_dir: Root folder of the Parquet dataset.
+        selected_only: Only return the rows kept by `filter_annotations`.
+        columns: Columns to read, all by default.
+
+    Returns:
+        The annotations with a `dataset` column.
+    """
+    filters = [('selected', '==', True)] if selected_only else None
+    return pd.read_parquet(parquet_dir, columns=columns, filters=filters)
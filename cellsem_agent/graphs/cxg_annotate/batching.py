@@ -0,0 +1,73 @@
+"""
+Token budget based batching of cell type entries for the annotator agent.
+"""
+import json
+from typing import TYPE_CHECKING, List, Sequence, Tuple
+
+from pydantic import BaseModel
+
+from cellsem_agent.ontology.cl_index import normalize_term
+
+if TYPE_CHECKING:
+    from cellsem_agent.agents.annotator.annotator_agent import TextAnnotation
+    from cellsem_agent.agents.paper_celltype.paper_celltype_agent import CellTypeEntry
+
+# Rough number of characters per token for English text and JSON
+CHARS_PER_TOKEN = 4
+# Expected tokens of the search tool calls and results an entry adds to the conversation
+TOOL_TOKENS_PER_ENTRY = 600
+
+
+def estimate_tokens(entry: BaseModel) -> int:
+    """Estimate the tokens an entry costs the annotator: its JSON input plus the expected tool call overhead."""
+    return len(json.dumps(entry.model_dump(), indent=2)) // CHARS_PER_TOKEN + TOOL_TOKENS_PER_ENTRY
+
+
+def make_batches(entries: Sequence["CellTypeEntry"], token_budget: int,
+                 max_batch_size: int) -> List[List["CellTypeEntry"]]:
+    """
+    Group consecutive entries into batches whose estimated tokens stay within a budget.
+
+    Short entries are packed into larger batches and verbose ones into smaller batches; an
+    entry over the budget on its own forms a batch by itself. Entries with the same name go to
+    different batches, as annotations refer to their entry by name.
+
+    Args:
+        entries: The entries to batch, in order.
+        token_budget: Estimated tokens allowed per batch.
+        max_batch_size: Maximum number of entries per batch.
+
+    Returns:
+        The batches, preserving the entry order.
+    """
+    batches = []
+    batch: List["CellTypeEntry"] = []
+    batch_tokens = 0
+    for entry in entries:
+        tokens = estimate_tokens(entry)
+        if batch and (batch_tokens + tokens > token_budget or len(batch) == max_batch_size
+                      or any(other.name == entry.name for other in batch)):
+            batches.append(batch)
+            batch = []
+            batch_tokens = 0
+        batch.append(entry)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def missing_entries(batch: Sequence["CellTypeEntry"],
+                    annotations: Sequence["TextAnnotation"]) -> List["CellTypeEntry"]:
+    """Return the entries of a batch that no annotation refers to by `input_name`."""
+    annotated = {annotation.input_name for annotation in annotations}
+    return [entry for entry in batch if entry.name not in annotated]
+
+
+def span_key(entry: "CellTypeEntry") -> Tuple[str, str, str]:
+    """
+    Key of what an entry asks to ground: its name, its normalized full name (or name) and tissue
+    context. The annotator grounds the name as a span of its own and copies it to the `text` of
+    the annotations, so entries sharing a full name but not a name are grounded separately.
+    """
+    return entry.name, normalize_term(entry.full_name or entry.name), normalize_term(entry.tissue_context or "")
@@ -0,0 +1,69 @@
+"""
+Append-only checkpoints of the annotations completed for a dataset.
+"""
+import json
+import logging
+import os
+from typing import Any, Dict, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_FILE_NAME = "annotation_checkpoint.jsonl"
+
+
+class AnnotationCheckpoint:
+    """
+    JSONL file with one line per annotated entry: its name, the span key it was grounded with
+    and its annotations. Lines are flushed as batches complete, so an interrupted run can resume
+    from the entries already done.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._tail_checked = False
+
+    def load(self) -> Dict[str, Tuple[Tuple[str, ...], List[Dict[str, Any]]]]:
+        """
+        Read the completed entries.
+
+        Returns:
+            The span key and annotations of each completed entry, by entry name.
+        """
+        completed: Dict[str, Tuple[Tuple[str, ...], List[Dict[str, Any]]]] = {}
+        if not os.path.exists(self.path):
+            return completed
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # the last line is cut short when the process is killed while writing it
+                    logger.warning(f"Ignoring unreadable line {line_number} of {self.path}")
+                    continue
+                completed[record["name"]] = (tuple(record["key"]), record["annotations"])
+        return completed
+
+    def append(self, name: str, key: Sequence[str], annotations: List[Dict[str, Any]]) -> None:
+        """Record the annotations of an entry."""
+        line = json.dumps({"name": name, "key": list(key), "annotations": annotations}) + "\n"
+        if not self._tail_checked:
+            # a line cut short by a crash is terminated so that it does not swallow this record
+            if self._ends_with_partial_line():
+                line = "\n" + line
+            self._tail_checked = True
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _ends_with_partial_line(self) -> bool:
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return False
+        with open(self.path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b"\n"
+
+    def remove(self) -> None:
+        """Delete the checkpoint, e.g. once the dataset outputs are written."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -1,14 +1,31 @@
 import asyncio
 import os.path
+from collections import defaultdict
+from typing import List, Optional
 import json
 import pandas as pd
 
 from dotenv import load_dotenv
+from pydantic_ai.exceptions import UnexpectedModelBehavior
 from pydantic_graph import BaseNode, End, Graph, GraphRunContext
 
-from cellsem_agent.agents.annotator.annotator_agent import annotator_agent
+from cellsem_agent.agents.annotator.annotator_agent import annotator_agent, TextAnnotation
+from cellsem_agent.agents.annotator.annotator_tools import pre_ground_entries
 from cellsem_agent.agents.paper_celltype.paper_celltype_agent import celltype_agent, CellTypeEntry
-from cellsem_agent.agents.paper_celltype.paper_celltype_tools import get_full_text, read_json
+from cellsem_agent.agents.paper_celltype.paper_celltype_tools import (PREFILL_RULES_VERSION, get_full_text, merge_entries,
+                                                                      prefill_entries, read_json)
+from cellsem_agent.file_utils import file_sha256
+from cellsem_agent.graphs.cxg_annotate.annotation_io import (filter_annotations, write_parquet_partition,
+                                                             write_tsvs)
+from cellsem_agent.graphs.cxg_annotate.batching import CHARS_PER_TOKEN, make_batches, missing_entries, span_key
+from cellsem_agent.graphs.cxg_annotate.checkpoint import CHECKPOINT_FILE_NAME, AnnotationCheckpoint
+from cellsem_agent.graphs.cxg_annotate.datasets import load_datasets, schedule
+from cellsem_agent.graphs.cxg_annotate.expansion_cache import (LEGACY_CACHE_FILE_NAME, ExpansionCache, get_model_name,
+                                                             read_legacy_cache)
+from cellsem_agent.ontology.search_backends import get_local_index
+from cellsem_agent.papers.abbreviations import find_abbreviations
+from cellsem_agent.papers.pdf_text import iter_chunks
+from cellsem_agent.papers.retrieval import SELECTION_VERSION, relevant_text
 from aurelian.agents.literature.literature_agent import literature_agent
 
 
@@ -28,98 +45,41 @@ cxg_annotate_logger.propagate = True
 logfire.configure()
 
 IS_TEST_MODE = False
+# Number of annotator agent requests in flight at once, across all datasets
+MAX_CONCURRENT_BATCHES = 4
+# Number of times a failed annotator batch is retried
+BATCH_RETRIES = 2
+# Estimated tokens (entries plus search tool traffic) per annotator request. A typical entry is
+# estimated at ~650 tokens, mostly TOOL_TOKENS_PER_ENTRY, so about 12 short entries fit and
+# verbose entries make smaller batches
+ANNOTATOR_TOKEN_BUDGET = 8000
+# Cap on the entries of a batch, reached by short entries only
+MAX_BATCH_SIZE = 12
+# How GetFullNames gives the paper to the agent: "full" sends the whole paper and supplement,
+# "retrieval" only the passages BM25 ranks highest for the cc.labels and their fragments, and
+# "chunked" runs the agent on chunks of the paper concurrently and merges the results
+FULL_NAMES_MODE = "full"
+# Estimated prompt tokens above which GetFullNames falls back to chunked extraction
+FULL_NAMES_MAX_TOKENS = 100_000
+FULL_NAMES_CHUNK_TOKENS = 30_000
+LABELS_PER_CHUNK = 40
+MAX_CONCURRENT_CHUNKS = 4
+# Number of datasets (or groups of datasets sharing a paper) GetFullNames extracts at once
+MAX_CONCURRENT_DATASETS = 4
+# Whether GetGroundings skips the entries checkpointed by an interrupted run
+RESUME = True
+# Whether labels that expand with the abbreviations defined in the paper skip the agent
+PREFILL_FULL_NAMES = True
 
-CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
-DATASETS_DIR = os.path.join(CURRENT_DIR, "../../../", "tests/test_data/cell_mappings_input")
-
-@dataclass
-class Dataset:
-    name: str
-    publication_file_name: str
-    supplementary_file_name: str
-    data_file_name: str
-
-@dataclass
-class State:
-    paper_expansion: dict[str, CellTypeEntry]
-    is_test_mode: bool = IS_TEST_MODE
-
-@dataclass
-class GetGroundings(BaseNode[State, None, str]):
-
-    async def run(self, ctx: GraphRunContext[State]) -> End:
-        for dataset_name in ctx.state.paper_expansion:
-            cxg_annotate_logger.info(f"Dataset: {dataset_name}")
-            expansions = ctx.state.paper_expansion[dataset_name]
-            # expansions_json = json.dumps([entry.model_dump() for entry in expansions], indent=2)
-            batch_size = 4
-            all_annotations = []
-            for i in range(0, len(expansions), batch_size):
-                batch = expansions[i:i + batch_size]
-                expansions_json = json.dumps([entry.model_dump() for entry in batch], indent=2)
-                agent_response = await annotator_agent.run(expansions_json)
-                all_annotations.extend(agent_response.output.annotations)
-
-            data = [entry.model_dump() for entry in all_annotations]
-            df = pd.DataFrame(data)
-            filtered_df = self.filter_annotations(df)
-            df.to_csv(
-                os.path.join(DATASETS_DIR, dataset_name + "/cell_type_annotations_un_filtered.tsv"), sep='\t',
-                index=False)
-            filtered_df.to_csv(os.path.join(DATASETS_DIR, dataset_name + "/cell_type_annotations.tsv"), sep='\t', index=False)
-        return End("Report generated and saved to individual dataset folders.")
-
-    def filter_annotations(self, df):
-        df['orig_idx'] = df.index
-
-        df = df[df['cl_id'].str.startswith('CL:')]
-
-        def filter_no_match(group):
-            if (group['cl_id'] != 'NO MATCH found').any():
-                return group[group['cl_id'] != 'NO MATCH found']
-            return group
-
-        # For each input_name, remove "NO MATCH found" if any valid cl_id exists
-        df = df.groupby('input_name', group_keys=False).apply(filter_no_match).reset_index(
-            drop=True)
-
-        # For each input_name, keep only the first row for each unique cl_id
-        df = df.drop_duplicates(subset=['input_name', 'cl_id'],
-                                                                     keep='first')
-
-        # Restore original order
-        df = df.sort_values('orig_idx').drop(columns='orig_idx').reset_index(drop=True)
-        return df
-
+# Root of a Parquet dataset GetGroundings also writes each dataset's annotations to (needs pyarrow)
+PARQUET_DIR = os.environ.get("CXG_PARQUET_DIR")
 
-@dataclass
-class GetFullNames(BaseNode[State, None, str]):
-
-    async def run(self, ctx: GraphRunContext[State]) -> GetGroundings:
-        print("Running GetFullNames node")
-        datasets = get_input_data()
-        if ctx.state.is_test_mode:
-            datasets = datasets[:1]  # Limit to one dataset for testing
-
-        for dataset in datasets:
-            print(f"Processing dataset: {dataset.name}")
-            dataset_folder = os.path.join(DATASETS_DIR, dataset.name)
-            dataset_cache = os.path.join(dataset_folder, "cache.json")
-            if not os.path.exists(dataset_cache):
-                json_file_path = os.path.join(dataset_folder, dataset.data_file_name)
-                pdf_file_path = os.path.join(dataset_folder, dataset.publication_file_name)
-                supplementary_file_path = os.path.join(dataset_folder, dataset.supplementary_file_name)
-
-                print(f"Reading JSON from: {json_file_path}")
-                cc_labels_data = read_json(None, json_file_path)
-
-                print(f"Processing PDF from: {pdf_file_path}")
-                paper_full_text = get_full_text(None, pdf_file_path)
-
-                print(f"Processing supplementary PDF from: {supplementary_file_path}")
-                supplementary_full_text = get_full_text(None, supplementary_file_path)
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATASETS_DIR = os.environ.get("CXG_DATASETS_DIR",
+                              os.path.join(CURRENT_DIR, "../../../", "tests/test_data/cell_mappings_input"))
 
-                prompt_instructions = f"""
+# GetFullNames prompt, part of the paper expansion cache key so editing it invalidates cached expansions
+FULL_NAMES_PROMPT = """
                     You are tasked with extracting cell type information from the provided academic paper content, supplementary material,
                     and the associated JSON data.
         
@@ -129,13 +89,13 @@ class GetFullNames(BaseNode[State, None, str]):
                     cell type entries. Each entry must follow the `CellTypeEntry` schema.
         
                     --- JSON Input Data (cc.label column and surrounding context):
-                    {json.dumps(cc_labels_data, indent=2)}
+                    {cc_labels}
         
                     --- Academic Paper Content (extracted from PDF):
-                    {paper_full_text}
+                    {paper_text}
                     
                     --- Academic Paper Supplementary Materials Content (extracted from PDF):
-                    {supplementary_full_text}
+                    {supplementary_text}
         
                     --- COLUMN DEFINITIONS AND LOGIC:
                     - `name`: The exact `cc.label` from the input JSON.
@@ -156,41 +116,347 @@ class GetFullNames(BaseNode[State, None, str]):
                     Do not ask for confirmation.
                     Provide the output as a JSON array of `CellTypeEntry` objects.
                     """
-                agent_response = await celltype_agent.run(prompt_instructions)
 
-                for entry in agent_response.output.cell_type_annotations:
-                    print(f"Name: {entry.name}, Full Name: {entry.full_name}, Synonyms: {entry.paper_synonyms}, Tissue Context: {entry.tissue_context}")
-                ctx.state.paper_expansion[dataset.name] = agent_response.output.cell_type_annotations
-                print(f"Saving results to cache for dataset: {dataset.name}")
-                with open(dataset_cache, 'w') as cache_file:
-                    json.dump([entry.model_dump() for entry in ctx.state.paper_expansion[dataset.name]], cache_file, indent=2)
+
+@dataclass
+class State:
+    paper_expansion: dict[str, CellTypeEntry]
+    is_test_mode: bool = IS_TEST_MODE
+    max_concurrent_batches: int = MAX_CONCURRENT_BATCHES
+    full_names_mode: str = FULL_NAMES_MODE
+    prefill_full_names: bool = PREFILL_FULL_NAMES
+    resume: bool = RESUME
+    datasets_dir: str = DATASETS_DIR
+    # dataset names or glob patterns to process, all datasets of datasets_dir by default
+    dataset_names: Optional[List[str]] = None
+    max_concurrent_datasets: int = MAX_CONCURRENT_DATASETS
+    parquet_dir: Optional[str] = PARQUET_DIR
+
+@dataclass
+class GetGroundings(BaseNode[State, None, str]):
+
+    async def run(self, ctx: GraphRunContext[State]) -> End:
+        cl_index = get_local_index()
+        # a single semaphore bounds the agent requests of all datasets together
+        semaphore = asyncio.Semaphore(ctx.state.max_concurrent_batches)
+        dataset_annotations = {dataset_name: [] for dataset_name in ctx.state.paper_expansion}
+        checkpoints = {dataset_name: AnnotationCheckpoint(os.path.join(ctx.state.datasets_dir, dataset_name,
+                                                                       CHECKPOINT_FILE_NAME))
+                       for dataset_name in ctx.state.paper_expansion}
+        # identical spans of different datasets (or of one dataset) are grounded once
+        spans = {}
+        span_members = defaultdict(list)
+        for dataset_name, expansions in ctx.state.paper_expansion.items():
+            cxg_annotate_logger.info(f"Dataset: {dataset_name}")
+            if ctx.state.resume:
+                completed = checkpoints[dataset_name].load()
             else:
-                print(f"Using cached data for dataset: {dataset.name}")
-                with open(dataset_cache, 'r') as cache_file:
-                    cached_data = json.load(cache_file)
-                    ctx.state.paper_expansion[dataset.name] = [CellTypeEntry(**entry) for entry in cached_data]
+                completed = {}
+                checkpoints[dataset_name].remove()
+            if cl_index is not None:
+                # exact label/synonym matches do not need the annotator agent
+                grounded, expansions = pre_ground_entries(expansions, cl_index)
+                dataset_annotations[dataset_name].extend(grounded)
+            resumed = 0
+            for entry in expansions:
+                key = span_key(entry)
+                if entry.name in completed and completed[entry.name][0] == key:
+                    dataset_annotations[dataset_name].extend(TextAnnotation(**annotation)
+                                                             for annotation in completed[entry.name][1])
+                    resumed += 1
+                    continue
+                spans.setdefault(key, entry)
+                span_members[key].append((dataset_name, entry.name))
+            if resumed:
+                cxg_annotate_logger.info(f"Resuming {dataset_name}: {resumed} entries already annotated")
+        cxg_annotate_logger.info(f"Grounding {len(spans)} distinct spans for "
+                                 f"{sum(len(members) for members in span_members.values())} entries")
+
+        async def annotate_and_record(batch):
+            annotations = await self.annotate_batch(batch, semaphore)
+            self.record_batch(batch, annotations, span_members, dataset_annotations, checkpoints)
+
+        batches = make_batches(list(spans.values()), ANNOTATOR_TOKEN_BUDGET, MAX_BATCH_SIZE)
+        # failed batches do not cancel the others, so that a rerun has as little left to do as possible
+        results = await asyncio.gather(*(annotate_and_record(batch) for batch in batches), return_exceptions=True)
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            cxg_annotate_logger.error(f"{len(errors)} of {len(batches)} annotator batches failed, completed batches "
+                                      f"are checkpointed and skipped when the graph is run again")
+            raise errors[0]
+
+        for dataset_name, annotations in dataset_annotations.items():
+            self.write_annotations(ctx.state.datasets_dir, dataset_name, ctx.state.paper_expansion[dataset_name],
+                                   annotations, ctx.state.parquet_dir)
+            checkpoints[dataset_name].remove()
+        return End("Report generated and saved to individual dataset folders.")
+
+    def record_batch(self, batch, annotations, span_members, dataset_annotations, checkpoints):
+        """
+        Copy the annotations of a batch to every dataset entry with the same span and append them
+        to the dataset checkpoints.
+        """
+        # names are unique within a batch, see make_batches
+        batch_keys = {entry.name: span_key(entry) for entry in batch}
+        span_annotations = {key: [] for key in batch_keys.values()}
+        for annotation in annotations:
+            if annotation.input_name not in batch_keys:
+                cxg_annotate_logger.warning(f"Dropping annotation of unknown entry {annotation.input_name}")
+                continue
+            span_annotations[batch_keys[annotation.input_name]].append(annotation)
+        for key, key_annotations in span_annotations.items():
+            for dataset_name, name in span_members[key]:
+                copies = [annotation.model_copy(update={"input_name": name}) for annotation in key_annotations]
+                dataset_annotations[dataset_name].extend(copies)
+                checkpoints[dataset_name].append(name, key, [annotation.model_dump() for annotation in copies])
+
+    def write_annotations(self, datasets_dir, dataset_name, expansions, annotations, parquet_dir=None):
+        entry_order = {entry.name: i for i, entry in enumerate(expansions)}
+        annotations = sorted(annotations, key=lambda annotation: entry_order.get(annotation.input_name, len(entry_order)))
+
+        data = [entry.model_dump() for entry in annotations]
+        df = pd.DataFrame(data)
+        write_tsvs(os.path.join(datasets_dir, dataset_name), df)
+        if parquet_dir:
+            write_parquet_partition(parquet_dir, dataset_name, df)
+
+    async def annotate_batch(self, batch, semaphore):
+        """
+        Annotate a batch, splitting it in halves when the output is unusable (e.g. truncated at the
+        length limit) and re-running the entries the agent left out.
+        """
+        try:
+            annotations = await self.run_annotator(batch, semaphore)
+        except UnexpectedModelBehavior as e:
+            if len(batch) == 1:
+                raise
+            cxg_annotate_logger.warning(f"Splitting batch of {len(batch)} entries after invalid output: {e}")
+            return await self.annotate_split(batch, semaphore)
+        missing = missing_entries(batch, annotations)
+        if missing and len(batch) > 1:
+            cxg_annotate_logger.warning(f"Annotator skipped {[entry.name for entry in missing]}, retrying them")
+            annotations = list(annotations) + await self.annotate_split(missing, semaphore)
+        elif missing:
+            cxg_annotate_logger.warning(f"Annotator returned no annotation for {missing[0].name}")
+        return annotations
+
+    async def annotate_split(self, batch, semaphore):
+        if len(batch) == 1:
+            return await self.annotate_batch(batch, semaphore)
+        middle = len(batch) // 2
+        first, second = await asyncio.gather(self.annotate_batch(batch[:middle], semaphore),
+                                             self.annotate_batch(batch[middle:], semaphore))
+        return list(first) + list(second)
+
+    async def run_annotator(self, batch, semaphore):
+        expansions_json = json.dumps([entry.model_dump() for entry in batch], indent=2)
+        for attempt in range(BATCH_RETRIES + 1):
+            try:
+                async with semaphore:
+                    agent_response = await annotator_agent.run(expansions_json)
+                return agent_response.output.annotations
+            except UnexpectedModelBehavior:
+                # retrying the same batch would fail the same way, the caller splits it instead
+                raise
+            except Exception as e:
+                if attempt == BATCH_RETRIES:
+                    raise
+                cxg_annotate_logger.warning(
+                    f"Annotator batch {[entry.name for entry in batch]} failed (attempt {attempt + 1}): {e}")
+                await asyncio.sleep(2 ** attempt)
+
+    def filter_annotations(self, df):
+        return filter_annotations(df)
+
+
+@dataclass
+class GetFullNames(BaseNode[State, None, str]):
+
+    async def run(self, ctx: GraphRunContext[State]) -> GetGroundings:
+        print("Running GetFullNames node")
+        datasets = get_input_data(ctx.state.datasets_dir, ctx.state.dataset_names)
+        if ctx.state.is_test_mode:
+            datasets = datasets[:1]  # Limit to one dataset for testing
+        # the most expensive datasets start first so that the cheap ones fill in around them
+        datasets = schedule(ctx.state.datasets_dir, datasets)
+
+        expansion_cache = ExpansionCache()
+        model_name = get_model_name(celltype_agent)
+        # datasets annotated from the same paper and supplement are extracted together, once
+        document_groups = {}
+        for dataset in datasets:
+            dataset_folder = os.path.join(ctx.state.datasets_dir, dataset.name)
+            paper_paths = [os.path.join(dataset_folder, dataset.publication_file_name),
+                           os.path.join(dataset_folder, dataset.supplementary_file_name)]
+            if all(os.path.exists(path) for path in paper_paths):
+                document_key = tuple(file_sha256(path) for path in paper_paths)
+            else:
+                # without its papers a dataset can only use its own cache.json, see expand_group
+                document_key = (None, dataset.name)
+            document_groups.setdefault(document_key, []).append(dataset)
+        if len(document_groups) < len(datasets):
+            cxg_annotate_logger.info(f"{len(datasets)} datasets share {len(document_groups)} distinct papers")
+
+        semaphore = asyncio.Semaphore(ctx.state.max_concurrent_datasets)
+
+        async def expand_scheduled(group):
+            async with semaphore:
+                await self.expand_group(ctx, group, expansion_cache, model_name)
+
+        await asyncio.gather(*(expand_scheduled(group) for group in document_groups.values()))
+        # keep the scheduled order rather than the completion order
+        ctx.state.paper_expansion = {dataset.name: ctx.state.paper_expansion[dataset.name] for dataset in datasets
+                                     if dataset.name in ctx.state.paper_expansion}
+        cxg_annotate_logger.info(expansion_cache.report())
         return GetGroundings()
 
-def get_input_data():
-    datasets = [
-        Dataset("gut", "Burclaff_et_al._(2022)_paper.pdf",
-                "Burclaff_et_al._(2022)_supp_material.pdf",
-                "healthy_adult_human_small_intestine_and_colon_epithelium.json"),
-        Dataset("Bipolar_cells", "Yan_et_al(2020)_paper.pdf", "Yan_et_al(2020)_suppl_material.pdf",
-                "Bipolar cells of the human fovea and peripheral retina.json"),
-        Dataset("Human Skin fibroblast", "Solé-Boldo_et_al(2020)_paper.pdf",
-                "Solé-Boldo_et_al(2020)_suppl_material.pdf",
-                "Single-cell transcriptomes of the human skin reveal age-related loss of fibroblast priming.json"),
-        Dataset("retinal_ganglion_cells", "Yan_et_al(2020)_paper.pdf",
-                "Yan_et_al(2020)_suppl_material.pdf",
-                "Retinal_ganglion_cells of_the_human_fovea_and_peripheral_retina.json"),
-        Dataset("Trabecular Meshwork and Corneal Scleral wedge",
-                "van-zyl-et-al-cell-atlas-of-the-human-ocular-anterior-segment-tissue-specific-and-shared-cell-types.pdf",
-                "suppl_material.pdf", "tranbecular_meshwork_and_corneal_scleral_wedge.json")]
-    return datasets
-
-async def main():
-    state = State(dict(), is_test_mode=IS_TEST_MODE)
+    async def expand_group(self, ctx, group, expansion_cache, model_name):
+        """
+        Extract the cell type entries of datasets sharing a paper and supplement with one set of
+        agent runs over the union of their labels, then give each dataset the entries of its labels.
+        """
+        group_name = " + ".join(dataset.name for dataset in group)
+        print(f"Processing dataset: {group_name}")
+        dataset_folder = os.path.join(ctx.state.datasets_dir, group[0].name)
+        pdf_file_path = os.path.join(dataset_folder, group[0].publication_file_name)
+        supplementary_file_path = os.path.join(dataset_folder, group[0].supplementary_file_name)
+        json_file_paths = [os.path.join(ctx.state.datasets_dir, dataset.name, dataset.data_file_name)
+                           for dataset in group]
+        missing_files = [path for path in [pdf_file_path, supplementary_file_path] + json_file_paths
+                         if not os.path.exists(path)]
+        if missing_files:
+            for dataset in group:
+                legacy_cache = read_legacy_cache(os.path.join(ctx.state.datasets_dir, dataset.name))
+                if legacy_cache is not None:
+                    cxg_annotate_logger.info(f"Using {LEGACY_CACHE_FILE_NAME} of {dataset.name}, its inputs "
+                                             f"{missing_files} are missing")
+                    ctx.state.paper_expansion[dataset.name] = [CellTypeEntry(**entry) for entry in legacy_cache]
+                else:
+                    cxg_annotate_logger.error(f"Skipping {dataset.name}: missing {missing_files} and no "
+                                              f"{LEGACY_CACHE_FILE_NAME} to fall back on")
+            return
+        mode = ctx.state.full_names_mode
+        if mode == "retrieval":
+            mode = f"{mode}:{SELECTION_VERSION}"
+        cache_key = ExpansionCache.make_key([pdf_file_path, supplementary_file_path] + json_file_paths,
+                                            FULL_NAMES_PROMPT, model_name, mode,
+                                            f"prefill={ctx.state.prefill_full_names}:{PREFILL_RULES_VERSION}")
+
+        dataset_labels = {}
+        unique_rows = {}
+        for dataset, json_file_path in zip(group, json_file_paths):
+            print(f"Reading JSON from: {json_file_path}")
+            rows = read_json(None, json_file_path)
+            dataset_labels[dataset.name] = [row["cc.label"] for row in rows]
+            # a label shared by datasets of the same paper means the same cell type
+            for row in rows:
+                unique_rows.setdefault(row["cc.label"], row)
+        cc_labels_data = list(unique_rows.values())
+
+        # cache.json is not keyed on the inputs, so with all of them at hand it is never used
+        cached_data = expansion_cache.get(cache_key)
+        if cached_data is None:
+            labels = [row["cc.label"] for row in cc_labels_data]
+
+            cell_type_entries = []
+            if ctx.state.prefill_full_names:
+                # PDF parsing blocks, so it runs in a thread to let the other groups proceed
+                texts = [await asyncio.to_thread(get_full_text, None, pdf_file_path),
+                         await asyncio.to_thread(get_full_text, None, supplementary_file_path)]
+                cell_type_entries, cc_labels_data = await asyncio.to_thread(prefill_entries, cc_labels_data, texts)
+                cxg_annotate_logger.info(f"Pre-filled {len(cell_type_entries)} of {len(labels)} entries of "
+                                         f"{group_name} from the paper abbreviations")
+
+            if cc_labels_data and ctx.state.full_names_mode == "chunked":
+                cell_type_entries += await self.extract_chunked(group_name, cc_labels_data,
+                                                                pdf_file_path, supplementary_file_path)
+            elif cc_labels_data:
+                cell_type_entries += await self.extract(group_name, cc_labels_data, pdf_file_path,
+                                                        supplementary_file_path, ctx.state.full_names_mode)
+            label_order = {label: i for i, label in enumerate(labels)}
+            cell_type_entries.sort(key=lambda entry: label_order.get(entry.name, len(labels)))
+
+            for entry in cell_type_entries:
+                print(f"Name: {entry.name}, Full Name: {entry.full_name}, Synonyms: {entry.paper_synonyms}, Tissue Context: {entry.tissue_context}")
+            print(f"Saving results to cache for dataset: {group_name}")
+            expansion_cache.put(cache_key, [entry.model_dump() for entry in cell_type_entries],
+                                dataset=group_name, model=model_name)
+        else:
+            print(f"Using cached data for dataset: {group_name}")
+            cell_type_entries = [CellTypeEntry(**entry) for entry in cached_data]
+
+        if len(group) == 1:
+            ctx.state.paper_expansion[group[0].name] = cell_type_entries
+            return
+        entries_by_name = {entry.name: entry for entry in cell_type_entries}
+        for dataset in group:
+            ctx.state.paper_expansion[dataset.name] = [entries_by_name[label] for label in dataset_labels[dataset.name]
+                                                       if label in entries_by_name]
+
+    async def extract(self, dataset_name, cc_labels_data, pdf_file_path, supplementary_file_path, mode):
+        print(f"Processing PDF from: {pdf_file_path}")
+        paper_full_text = await asyncio.to_thread(get_full_text, None, pdf_file_path)
+
+        print(f"Processing supplementary PDF from: {supplementary_file_path}")
+        supplementary_full_text = await asyncio.to_thread(get_full_text, None, supplementary_file_path)
+
+        if mode == "retrieval":
+            labels = [row["cc.label"] for row in cc_labels_data]
+            full_size = len(paper_full_text) + len(supplementary_full_text)
+            # the paper and its supplement share their abbreviations
+            abbreviations = await asyncio.to_thread(find_abbreviations,
+                                                    paper_full_text + " " + supplementary_full_text)
+            paper_full_text = await asyncio.to_thread(relevant_text, pdf_file_path, labels, abbreviations)
+            supplementary_full_text = await asyncio.to_thread(relevant_text, supplementary_file_path, labels,
+                                                              abbreviations)
+            pruned_size = len(paper_full_text) + len(supplementary_full_text)
+            cxg_annotate_logger.info(f"Retrieved paper context for {dataset_name}: {pruned_size} of {full_size} "
+                                     f"characters ({full_size / max(pruned_size, 1):.1f}x smaller)")
+
+        prompt_instructions = FULL_NAMES_PROMPT.format(cc_labels=json.dumps(cc_labels_data, indent=2),
+                                                       paper_text=paper_full_text,
+                                                       supplementary_text=supplementary_full_text)
+        prompt_tokens = len(prompt_instructions) // CHARS_PER_TOKEN
+        if prompt_tokens > FULL_NAMES_MAX_TOKENS:
+            cxg_annotate_logger.info(f"Prompt for {dataset_name} is ~{prompt_tokens} tokens, extracting in chunks")
+            return await self.extract_chunked(dataset_name, cc_labels_data, pdf_file_path, supplementary_file_path)
+        agent_response = await celltype_agent.run(prompt_instructions)
+        return agent_response.output.cell_type_annotations
+
+    async def extract_chunked(self, dataset_name, cc_labels_data, pdf_file_path, supplementary_file_path):
+        """
+        Map-reduce extraction: every chunk of cc.labels is run against every chunk of the paper and
+        supplement concurrently, and the entries of all runs are merged per label.
+        """
+        max_chars = FULL_NAMES_CHUNK_TOKENS * CHARS_PER_TOKEN
+        paper_chunks = await asyncio.to_thread(lambda: list(iter_chunks(pdf_file_path, max_chars)))
+        supplementary_chunks = await asyncio.to_thread(lambda: list(iter_chunks(supplementary_file_path, max_chars)))
+        text_chunks = [(text, "") for text in paper_chunks] + [("", text) for text in supplementary_chunks]
+        label_chunks = [cc_labels_data[i:i + LABELS_PER_CHUNK] for i in range(0, len(cc_labels_data), LABELS_PER_CHUNK)]
+        jobs = [(labels, paper_text, supplementary_text)
+                for labels in label_chunks for paper_text, supplementary_text in text_chunks]
+        cxg_annotate_logger.info(f"Extracting {dataset_name} in {len(jobs)} chunks "
+                                 f"({len(label_chunks)} label chunks x {len(text_chunks)} text chunks)")
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_CHUNKS)
+
+        async def run_chunk(labels, paper_text, supplementary_text):
+            prompt_instructions = FULL_NAMES_PROMPT.format(cc_labels=json.dumps(labels, indent=2),
+                                                           paper_text=paper_text,
+                                                           supplementary_text=supplementary_text)
+            async with semaphore:
+                agent_response = await celltype_agent.run(prompt_instructions)
+            return agent_response.output.cell_type_annotations
+
+        results = await asyncio.gather(*(run_chunk(*job) for job in jobs))
+        return merge_entries(results, [paper_text + supplementary_text for _, paper_text, supplementary_text in jobs],
+                             [row["cc.label"] for row in cc_labels_data])
+
+def get_input_data(datasets_dir=DATASETS_DIR, names=None):
+    return load_datasets(datasets_dir, names)
+
+async def main(datasets_dir=DATASETS_DIR, dataset_names=None, is_test_mode=IS_TEST_MODE, parquet_dir=PARQUET_DIR):
+    state = State(dict(), is_test_mode=is_test_mode, datasets_dir=datasets_dir, dataset_names=dataset_names,
+                  parquet_dir=parquet_dir)
     validation_graph = Graph(nodes=(GetFullNames, GetGroundings))
     result = await validation_graph.run(GetFullNames(), state=state)
     print(result.output)
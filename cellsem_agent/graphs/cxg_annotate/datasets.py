@@ -0,0 +1,137 @@
+"""
+Registry of the datasets processed by the cxg_annotate graph.
+
+Datasets are listed in a `datasets.json` manifest in the datasets directory or, without a
+manifest, discovered from its sub folders.
+"""
+import fnmatch
+import json
+import logging
+import os
+from dataclasses import asdict, dataclass
+from typing import List, Optional, Sequence
+
+from .batching import TOOL_TOKENS_PER_ENTRY
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE_NAME = "datasets.json"
+# Rough number of PDF bytes per token of extracted text
+PDF_BYTES_PER_TOKEN = 20
+# Words marking the supplementary material among the PDFs of a dataset folder
+SUPPLEMENTARY_MARKERS = ("supp", "suppl", "supplement", "supplementary")
+_NON_DATA_JSON = ("cache.json", MANIFEST_FILE_NAME)
+
+
+@dataclass
+class Dataset:
+    name: str
+    publication_file_name: str
+    supplementary_file_name: str
+    data_file_name: str
+
+
+def read_manifest(manifest_path: str) -> List[Dataset]:
+    """
+    Read a dataset manifest.
+
+    The manifest is a JSON object with a `datasets` list whose items have the fields of
+    `Dataset`; `name` is the dataset folder in the datasets directory.
+
+    Args:
+        manifest_path: The path to the manifest.
+
+    Returns:
+        The datasets in manifest order.
+    """
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    try:
+        return [Dataset(**item) for item in manifest["datasets"]]
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"Invalid dataset manifest {manifest_path}: {e}") from e
+
+
+def write_manifest(manifest_path: str, datasets: Sequence[Dataset]) -> None:
+    """Write datasets to a manifest, e.g. to pin the result of `discover_datasets`."""
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump({"datasets": [asdict(dataset) for dataset in datasets]}, f, indent=2, ensure_ascii=False)
+
+
+def discover_datasets(datasets_dir: str) -> List[Dataset]:
+    """
+    Find the datasets of a directory: every sub folder holding one labels JSON file, one
+    publication PDF and one supplementary PDF (named with one of `SUPPLEMENTARY_MARKERS`).
+
+    Args:
+        datasets_dir: The datasets directory.
+
+    Returns:
+        The datasets, sorted by name.
+    """
+    datasets = []
+    for name in sorted(os.listdir(datasets_dir)):
+        folder = os.path.join(datasets_dir, name)
+        if not os.path.isdir(folder):
+            continue
+        files = sorted(os.listdir(folder))
+        data_files = [f for f in files if f.lower().endswith(".json") and f not in _NON_DATA_JSON]
+        pdfs = [f for f in files if f.lower().endswith(".pdf")]
+        supplementary = [f for f in pdfs if any(marker in f.lower() for marker in SUPPLEMENTARY_MARKERS)]
+        publications = [f for f in pdfs if f not in supplementary]
+        if len(data_files) == 1 and len(publications) == 1 and len(supplementary) == 1:
+            datasets.append(Dataset(name, publications[0], supplementary[0], data_files[0]))
+        else:
+            logger.info(f"Skipping {folder}: expected one labels JSON, one publication and one supplementary PDF")
+    return datasets
+
+
+def load_datasets(datasets_dir: str, names: Optional[Sequence[str]] = None) -> List[Dataset]:
+    """
+    Get the datasets of a directory from its manifest, or by discovery when it has none.
+
+    Args:
+        datasets_dir: The datasets directory.
+        names: Dataset names or glob patterns (case-insensitive) to select, all datasets by default.
+
+    Returns:
+        The selected datasets.
+    """
+    manifest_path = os.path.join(datasets_dir, MANIFEST_FILE_NAME)
+    if os.path.exists(manifest_path):
+        datasets = read_manifest(manifest_path)
+    else:
+        datasets = discover_datasets(datasets_dir)
+    if names:
+        patterns = [name.lower() for name in names]
+        datasets = [dataset for dataset in datasets
+                    if any(fnmatch.fnmatchcase(dataset.name.lower(), pattern) for pattern in patterns)]
+    return datasets
+
+
+def estimate_cost(datasets_dir: str, dataset: Dataset) -> int:
+    """
+    Estimate the tokens a dataset costs the agents: its extracted paper text plus the search
+    traffic of its labels.
+    """
+    folder = os.path.join(datasets_dir, dataset.name)
+    pdf_bytes = 0
+    for file_name in (dataset.publication_file_name, dataset.supplementary_file_name):
+        path = os.path.join(folder, file_name)
+        if os.path.exists(path):
+            pdf_bytes += os.path.getsize(path)
+    labels = 0
+    data_path = os.path.join(folder, dataset.data_file_name)
+    if os.path.exists(data_path):
+        with open(data_path, 'r', encoding='utf-8-sig') as f:
+            labels = len(json.load(f))
+    return pdf_bytes // PDF_BYTES_PER_TOKEN + labels * TOOL_TOKENS_PER_ENTRY
+
+
+def schedule(datasets_dir: str, datasets: Sequence[Dataset]) -> List[Dataset]:
+    """
+    Order datasets by decreasing estimated cost, so that the longest ones start first and the
+    short ones fill the gaps when datasets are processed concurrently.
+    """
+    costs = {dataset.name: estimate_cost(datasets_dir, dataset) for dataset in datasets}
+    return sorted(datasets, key=lambda dataset: -costs[dataset.name])
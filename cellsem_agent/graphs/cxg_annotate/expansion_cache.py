@@ -0,0 +1,97 @@
+"""
+Content addressed cache of the paper expansions produced by GetFullNames.
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from cellsem_agent.file_utils import file_sha256, get_cache_dir
+
+logger = logging.getLogger(__name__)
+
+# Per dataset expansions written by earlier versions of the graph, e.g. in the test data
+LEGACY_CACHE_FILE_NAME = "cache.json"
+
+
+def get_model_name(agent: Any) -> str:
+    """Return the name of the model an agent runs on, e.g. "openai:gpt-4o"."""
+    model = agent.model
+    if model is None or isinstance(model, str):
+        return str(model)
+    return f"{model.system}:{model.model_name}"
+
+
+def read_legacy_cache(dataset_folder: str) -> Optional[List[Dict[str, Any]]]:
+    """Return the entries of the `cache.json` of a dataset folder, or None if it has none."""
+    path = os.path.join(dataset_folder, LEGACY_CACHE_FILE_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+class ExpansionCache:
+    """
+    Cache of cell type entries keyed on everything that determines them: the content of the
+    input files, the prompt template and the model name.
+
+    Entries are JSON files in a directory shared by all datasets (by default
+    `paper_expansions` in the cellsem-agent cache dir), so changing any input only misses
+    for the affected datasets and identical inputs are reused across datasets.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = cache_dir or get_cache_dir("paper_expansions")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(file_paths: Sequence[str], prompt_template: str, model_name: str, *options: str) -> str:
+        """
+        Compute the cache key of an expansion.
+
+        Args:
+            file_paths: Input files whose content the expansion depends on (paper, supplement, labels JSON).
+            prompt_template: The prompt template before its inputs are filled in.
+            model_name: The model producing the expansion.
+            options: Any other setting changing the prompt, such as how the paper context is built.
+
+        Returns:
+            The hex SHA-256 key.
+        """
+        digest = hashlib.sha256()
+        for path in file_paths:
+            digest.update(file_sha256(path).encode())
+        digest.update(hashlib.sha256(prompt_template.encode()).hexdigest().encode())
+        digest.update(model_name.encode())
+        for option in options:
+            digest.update(option.encode())
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + ".json")
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """Return the cached entries for a key, or None on a miss."""
+        path = self._path(key)
+        if not os.path.exists(path):
+            self.misses += 1
+            return None
+        self.hits += 1
+        with open(path, 'r') as f:
+            return json.load(f)["entries"]
+
+    def put(self, key: str, entries: List[Dict[str, Any]], **metadata: Any) -> None:
+        """Store entries under a key, with optional metadata such as the dataset name."""
+        record = {"key": key, "created": time.time(), **metadata, "entries": entries}
+        tmp_path = self._path(key) + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(record, f, indent=2)
+        os.replace(tmp_path, self._path(key))
+
+    def report(self) -> str:
+        return f"Paper expansion cache: {self.hits} hits, {self.misses} misses ({self.cache_dir})"
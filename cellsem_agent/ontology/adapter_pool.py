@@ -0,0 +1,64 @@
+"""
+Process-wide registry of oaklib adapters and the executor used for blocking searches.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from .search_config import get_config
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_adapters: Dict[str, Any] = {}
+_thread_local = threading.local()
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _is_thread_bound(selector: str) -> bool:
+    # sqlite connections can only be used from the thread that created them
+    return selector.startswith("sqlite:")
+
+
+def get_shared_adapter(selector: str) -> Any:
+    """
+    Get the oaklib adapter for a selector, creating it on first use.
+
+    Adapters are created once per process and shared between threads, except for sqlite
+    adapters which are created once per thread.
+
+    Args:
+        selector: An oaklib selector such as 'ols:cl' or 'sqlite:obo:cl'.
+
+    Returns:
+        The oaklib adapter.
+    """
+    from oaklib import get_adapter
+
+    if _is_thread_bound(selector):
+        adapters = getattr(_thread_local, "adapters", None)
+        if adapters is None:
+            adapters = _thread_local.adapters = {}
+        if selector not in adapters:
+            adapters[selector] = get_adapter(selector)
+        return adapters[selector]
+    adapter = _adapters.get(selector)
+    if adapter is None:
+        with _lock:
+            adapter = _adapters.get(selector)
+            if adapter is None:
+                logger.info(f"Creating oaklib adapter for {selector}")
+                adapter = _adapters[selector] = get_adapter(selector)
+    return adapter
+
+
+def get_search_executor() -> ThreadPoolExecutor:
+    """Get the bounded thread pool that runs blocking ontology searches."""
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=get_config().max_workers,
+                                               thread_name_prefix="cl-search")
+    return _executor
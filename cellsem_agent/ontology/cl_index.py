@@ -0,0 +1,242 @@
+"""
+In-memory Cell Ontology index with exact label and synonym lookups.
+"""
+import logging
+import re
+import threading
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from .fuzzy_index import FuzzyIndex
+
+logger = logging.getLogger(__name__)
+
+# Synonym scopes in the order their matches are reported.
+SYNONYM_SCOPES = ("EXACT", "NARROW", "BROAD", "RELATED")
+
+# Synonym scopes precise enough to ground a span without review.
+GROUNDING_SCOPES = ("EXACT",)
+
+_CURIE_PATTERN = re.compile(r"^([A-Za-z]+)[:_](\d+)$")
+_SEPARATORS = re.compile(r"[\s\-_]+")
+
+_IRREGULAR_PLURALS = {
+    "nuclei": "nucleus",
+    "cilia": "cilium",
+    "villi": "villus",
+    "stomata": "stoma",
+    "epithelia": "epithelium",
+    "mitochondria": "mitochondrion",
+}
+_INVARIANT_WORDS = {"glia", "series", "species", "lens", "iris", "pancreas", "plexus", "bus", "virus"}
+
+
+@dataclass
+class OntologyTerm:
+    id: str
+    label: str
+    synonyms: List[Tuple[str, str]] = field(default_factory=list)
+    definition: Optional[str] = None
+
+
+def normalize_term(text: str) -> str:
+    """
+    Normalize a term for hash lookups: case folded, with hyphens, underscores and
+    repeated whitespace collapsed to a single space.
+    """
+    return _SEPARATORS.sub(" ", text.casefold()).strip()
+
+
+def singularize(word: str) -> str:
+    """
+    Convert a (lower case) English plural noun to its singular form using simple suffix rules.
+    """
+    if word in _IRREGULAR_PLURALS:
+        return _IRREGULAR_PLURALS[word]
+    if word in _INVARIANT_WORDS or len(word) <= 3:
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("sses", "ches", "shes", "xes")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def singularize_phrase(text: str) -> str:
+    """
+    Singularize the head noun of a normalized phrase: the last word, or the word before
+    'of' in 'Y of X' forms, e.g. "goblet cells" and "cells of the retina".
+    """
+    words = text.split(" ")
+    head = words.index("of") - 1 if "of" in words[1:] else len(words) - 1
+    words[head] = singularize(words[head])
+    return " ".join(words)
+
+
+class CLIndex:
+    """
+    Hash based index over the labels and synonyms of an ontology.
+
+    Lookups are exact on the normalized form of the query, so "Goblet-cell" finds
+    "goblet cell"; near misses are resolved by `fuzzy_search`.
+    """
+
+    def __init__(self, terms: Iterable[OntologyTerm], version: Optional[str] = None):
+        self.version = version
+        self.terms: Dict[str, OntologyTerm] = {}
+        self._labels: Dict[str, List[str]] = defaultdict(list)
+        self._synonyms: Dict[str, Dict[str, List[str]]] = {scope: defaultdict(list) for scope in SYNONYM_SCOPES}
+        self._fuzzy: Optional["FuzzyIndex"] = None
+        self._fuzzy_lock = threading.Lock()
+        for term in terms:
+            self.add(term)
+
+    def add(self, term: OntologyTerm) -> None:
+        """Add a term to the index."""
+        self._fuzzy = None
+        self.terms[term.id] = term
+        self._labels[normalize_term(term.label)].append(term.id)
+        for scope, synonym in term.synonyms:
+            self._synonyms.get(scope, self._synonyms["RELATED"])[normalize_term(synonym)].append(term.id)
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def lookup_label(self, text: str) -> List[str]:
+        """Return the ids of terms whose label matches the text."""
+        return list(self._labels.get(normalize_term(text), []))
+
+    def lookup_synonym(self, text: str, scopes: Iterable[str] = SYNONYM_SCOPES) -> List[str]:
+        """Return the ids of terms with a synonym of one of the given scopes matching the text."""
+        key = normalize_term(text)
+        ids: List[str] = []
+        for scope in scopes:
+            ids.extend(i for i in self._synonyms[scope].get(key, []) if i not in ids)
+        return ids
+
+    def lookup_id(self, text: str) -> Optional[str]:
+        """Return the id if the text is a CURIE (or underscore form) of an indexed term."""
+        match = _CURIE_PATTERN.match(text.strip())
+        if not match:
+            return None
+        curie = f"{match.group(1).upper()}:{match.group(2)}"
+        return curie if curie in self.terms else None
+
+    def ground(self, text: str) -> Optional[Tuple[str, str]]:
+        """
+        Ground a span without review: its label, exact synonym, or the same after singularization.
+
+        Only unambiguous matches are returned; a span matching several terms at the same level
+        is left ungrounded.
+
+        Args:
+            text: The span to ground.
+
+        Returns:
+            A tuple of the CL ID and label, or None.
+        """
+        key = normalize_term(text)
+        for candidate in dict.fromkeys((key, singularize_phrase(key))):
+            for ids in (self._labels.get(candidate, []),
+                        self.lookup_synonym(candidate, scopes=GROUNDING_SCOPES)):
+                if len(set(ids)) == 1:
+                    return ids[0], self.terms[ids[0]].label
+                if ids:
+                    return None
+        return None
+
+    def search(self, text: str, limit: int = 20) -> List[Tuple[str, str]]:
+        """
+        Search the index.
+
+        Matches are ranked by id, label, then synonyms in `SYNONYM_SCOPES` order.
+
+        Args:
+            text: The term to search for.
+            limit: Maximum number of results.
+
+        Returns:
+            A list of tuples, each containing an ontology ID and a label.
+        """
+        ids: List[str] = []
+        curie = self.lookup_id(text)
+        if curie:
+            ids.append(curie)
+        for term_id in self.lookup_label(text) + self.lookup_synonym(text):
+            if term_id not in ids:
+                ids.append(term_id)
+        return [(term_id, self.terms[term_id].label) for term_id in ids[:limit]]
+
+    @property
+    def fuzzy(self) -> "FuzzyIndex":
+        """The approximate matching index over labels and synonyms, built on first use."""
+        if self._fuzzy is None:
+            with self._fuzzy_lock:
+                if self._fuzzy is None:
+                    from .fuzzy_index import FuzzyIndex
+
+                    self._fuzzy = FuzzyIndex.from_index(self)
+        return self._fuzzy
+
+    def fuzzy_search(self, text: str, limit: int = 5, min_score: float = 0.6) -> List[Tuple[str, str, float]]:
+        """
+        Approximate search over labels and synonyms, e.g. "colonocytes" finds "colonocyte".
+
+        Args:
+            text: The term to search for.
+            limit: Maximum number of results.
+            min_score: Minimum similarity, 1 - edit distance / length of the longer string.
+
+        Returns:
+            A list of tuples of an ontology ID, its label and the similarity score, best first.
+        """
+        return [(term_id, self.terms[term_id].label, score)
+                for term_id, _, score in self.fuzzy.search(text, limit=limit, min_score=min_score)]
+
+    @classmethod
+    def from_obo(cls, path: str, id_prefixes: Tuple[str, ...] = ("CL:",)) -> "CLIndex":
+        """
+        Build an index from an OBO file using fastobo.
+
+        Args:
+            path: Path to the OBO file, e.g. a local copy of cl.obo.
+            id_prefixes: Only terms with these id prefixes are indexed; obsolete terms are skipped.
+
+        Returns:
+            The populated index.
+        """
+        import fastobo
+
+        doc = fastobo.load(path)
+        version = None
+        for clause in doc.header:
+            if isinstance(clause, fastobo.header.DataVersionClause):
+                version = str(clause.version)
+        terms = []
+        for frame in doc:
+            if not isinstance(frame, fastobo.term.TermFrame):
+                continue
+            term_id = str(frame.id)
+            if not term_id.startswith(id_prefixes):
+                continue
+            label = None
+            definition = None
+            synonyms = []
+            obsolete = False
+            for clause in frame:
+                if isinstance(clause, fastobo.term.NameClause):
+                    label = str(clause.name)
+                elif isinstance(clause, fastobo.term.SynonymClause):
+                    synonyms.append((str(clause.synonym.scope), str(clause.synonym.desc)))
+                elif isinstance(clause, fastobo.term.DefClause):
+                    definition = str(clause.definition)
+                elif isinstance(clause, fastobo.term.IsObsoleteClause):
+                    obsolete = clause.obsolete
+            if label and not obsolete:
+                terms.append(OntologyTerm(term_id, label, synonyms, definition))
+        logger.info(f"Indexed {len(terms)} terms from {path}")
+        return cls(terms, version=version)
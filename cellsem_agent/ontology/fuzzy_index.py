@@ -0,0 +1,193 @@
+"""
+Approximate string matching over ontology labels and synonyms.
+"""
+import threading
+from collections import Counter, OrderedDict, defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .cl_index import CLIndex, normalize_term
+
+NGRAM_SIZE = 3
+# Number of recent queries whose results are kept in memory.
+MEMO_SIZE = 4096
+
+
+def ngrams(text: str, n: int = NGRAM_SIZE) -> List[str]:
+    """Return the distinct character n-grams of a normalized text, padded with spaces at both ends."""
+    padded = f" {text} "
+    return list(dict.fromkeys(padded[i:i + n] for i in range(len(padded) - n + 1)))
+
+
+def edit_distance(a: str, b: str, max_distance: Optional[int] = None) -> int:
+    """
+    Levenshtein distance between two strings.
+
+    Args:
+        a: First string.
+        b: Second string.
+        max_distance: Stop early and return max_distance + 1 once the distance is known to exceed it.
+
+    Returns:
+        The number of single character insertions, deletions and substitutions turning a into b.
+    """
+    # common prefixes and suffixes do not change the distance; near misses often differ only at the end
+    shortest = min(len(a), len(b))
+    prefix = 0
+    while prefix < shortest and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < shortest - prefix and a[-1 - suffix] == b[-1 - suffix]:
+        suffix += 1
+    a = a[prefix:len(a) - suffix]
+    b = b[prefix:len(b) - suffix]
+    if len(a) < len(b):
+        a, b = b, a
+    if not b:
+        return len(a) if max_distance is None or len(a) <= max_distance else max_distance + 1
+    if max_distance is not None and len(a) - len(b) > max_distance:
+        return max_distance + 1
+    if max_distance is None:
+        max_distance = len(a)
+    # only cells within max_distance of the diagonal can stay within max_distance
+    beyond = max_distance + 1
+    previous = [j if j <= max_distance else beyond for j in range(len(b) + 1)]
+    for i, ca in enumerate(a, 1):
+        low = max(1, i - max_distance)
+        high = min(len(b), i + max_distance)
+        current = [beyond] * (len(b) + 1)
+        current[0] = i if i <= max_distance else beyond
+        left = current[low - 1]
+        row_min = left
+        for j in range(low, high + 1):
+            substitution = previous[j - 1] + (ca != b[j - 1])
+            insertion = previous[j] + 1
+            left = left + 1
+            if substitution < left:
+                left = substitution
+            if insertion < left:
+                left = insertion
+            current[j] = left
+            if left < row_min:
+                row_min = left
+        if row_min > max_distance:
+            return beyond
+        previous = current
+    return min(previous[-1], beyond)
+
+
+class FuzzyIndex:
+    """
+    Character trigram inverted index with edit distance re-ranking.
+
+    Candidates are the strings sharing the most trigrams with the query (trigrams occurring in a
+    large share of the strings, such as those of "cell", are not used to gather candidates); the
+    most similar by trigram Dice coefficient are re-ranked by edit distance relative to the length
+    of the longer string.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, str]], max_df: float = 0.05):
+        """
+        Args:
+            entries: (term id, text) pairs, e.g. every label and synonym of an ontology.
+            max_df: Trigrams found in more than this share of the strings are not used to gather candidates.
+        """
+        self.texts: List[str] = []
+        self.ids: List[str] = []
+        seen = set()
+        for term_id, text in entries:
+            key = (term_id, normalize_term(text))
+            if key not in seen:
+                seen.add(key)
+                self.ids.append(term_id)
+                self.texts.append(key[1])
+        self._exact: Dict[str, List[int]] = defaultdict(list)
+        postings: Dict[str, List[int]] = defaultdict(list)
+        for i, text in enumerate(self.texts):
+            self._exact[text].append(i)
+            for gram in ngrams(text):
+                postings[gram].append(i)
+        self._postings = dict(postings)
+        self._gram_counts = [len(ngrams(text)) for text in self.texts]
+        self._max_postings = max(1, int(max_df * len(self.texts)))
+        self._memo: "OrderedDict[tuple, List[Tuple[str, str, float]]]" = OrderedDict()
+        # search runs on the threads of the search executor
+        self._memo_lock = threading.Lock()
+
+    @classmethod
+    def from_index(cls, index: CLIndex, max_df: float = 0.05) -> "FuzzyIndex":
+        """Build a fuzzy index over the labels and all synonyms of a `CLIndex`."""
+        entries = []
+        for term in index.terms.values():
+            entries.append((term.id, term.label))
+            entries.extend((term.id, synonym) for _, synonym in term.synonyms)
+        return cls(entries, max_df=max_df)
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def search(self, text: str, limit: int = 5, min_score: float = 0.6,
+               candidates: int = 30, rerank: int = 5) -> List[Tuple[str, str, float]]:
+        """
+        Find the indexed strings closest to a query.
+
+        Args:
+            text: The query.
+            limit: Maximum number of results, at most one per term id.
+            min_score: Minimum similarity, 1 - edit distance / length of the longer string.
+            candidates: Number of strings sharing the most trigrams with the query that are scored.
+            rerank: Number of candidates with the best trigram similarity re-ranked by edit distance.
+
+        Returns:
+            A list of (term id, matched text, score) tuples, best first.
+        """
+        query = normalize_term(text)
+        memo_key = (query, limit, min_score, candidates, rerank)
+        with self._memo_lock:
+            if memo_key in self._memo:
+                self._memo.move_to_end(memo_key)
+                return self._memo[memo_key]
+        results = self._search(query, limit, min_score, candidates, rerank)
+        with self._memo_lock:
+            self._memo[memo_key] = results
+            if len(self._memo) > MEMO_SIZE:
+                self._memo.popitem(last=False)
+        return results
+
+    def _search(self, query: str, limit: int, min_score: float,
+                candidates: int, rerank: int) -> List[Tuple[str, str, float]]:
+        if query in self._exact:
+            exact = self._exact[query]
+            return [(self.ids[i], self.texts[i], 1.0) for i in exact][:limit]
+        query_grams = [g for g in ngrams(query) if g in self._postings]
+        selective = [g for g in query_grams if len(self._postings[g]) <= self._max_postings]
+        common = [g for g in query_grams if len(self._postings[g]) > self._max_postings]
+        if not selective:
+            selective, common = common, []
+        counts: Counter = Counter()
+        for gram in selective:
+            counts.update(self._postings[gram])
+
+        # rank candidates by trigram similarity (Dice coefficient), then re-rank the best by edit distance
+        query_size = len(ngrams(query))
+        dice = []
+        for i, shared in counts.most_common(candidates):
+            padded = f" {self.texts[i]} "
+            shared += sum(gram in padded for gram in common)
+            dice.append((2 * shared / (query_size + self._gram_counts[i]), i))
+        dice.sort(key=lambda item: -item[0])
+
+        best: Dict[str, Tuple[float, int]] = {}
+        for _, i in dice[:rerank]:
+            candidate = self.texts[i]
+            longest = max(len(query), len(candidate))
+            max_distance = int(longest * (1 - min_score))
+            distance = edit_distance(query, candidate, max_distance)
+            if distance > max_distance:
+                continue
+            score = 1 - distance / longest
+            term_id = self.ids[i]
+            if term_id not in best or score > best[term_id][0]:
+                best[term_id] = (score, i)
+
+        ranked = sorted(best.values(), key=lambda item: (-item[0], self.texts[item[1]]))[:limit]
+        return [(self.ids[i], self.texts[i], round(score, 3)) for score, i in ranked]
@@ -0,0 +1,131 @@
+"""
+Rule based generation of search variants for cell type spans.
+"""
+import re
+from typing import Dict, List, Optional
+
+from .cl_index import normalize_term, singularize_phrase
+
+DEFAULT_ABBREVIATIONS = {
+    "si": "small intestine",
+    "ta": "transit amplifying",
+    "fae": "follicle associated epithelium",
+    "eec": "enteroendocrine cell",
+    "isc": "intestinal stem cell",
+    "rgc": "retinal ganglion cell",
+    "tm": "trabecular meshwork",
+    "opc": "oligodendrocyte precursor cell",
+}
+
+# Adjectival tissue forms and the noun used in 'Y of X' labels.
+TISSUE_ADJECTIVES = {
+    "colonic": "colon",
+    "intestinal": "intestine",
+    "duodenal": "duodenum",
+    "ileal": "ileum",
+    "gastric": "stomach",
+    "retinal": "retina",
+    "corneal": "cornea",
+    "scleral": "sclera",
+    "hepatic": "liver",
+    "renal": "kidney",
+    "pulmonary": "lung",
+    "cardiac": "heart",
+    "dermal": "dermis",
+    "epidermal": "epidermis",
+    "pancreatic": "pancreas",
+    "splenic": "spleen",
+}
+
+CELL_NOUNS = ("cell", "cyte", "blast", "phage", "glia", "neuron")
+
+_TOKEN_SPLIT = re.compile(r"(?<=[a-z])(?=\d)|(?<=\d)(?=[a-z])")
+
+
+def _mentions_cell_noun(text: str) -> bool:
+    return any(word.endswith(CELL_NOUNS) for word in text.split(" "))
+
+
+def expand_abbreviations(text: str, abbreviations: Dict[str, str]) -> str:
+    """Replace abbreviated words of a normalized span, e.g. "si ta" -> "small intestine transit amplifying"."""
+    words = []
+    for word in text.split(" "):
+        # split trailing numbers so that "rgc10" expands to "retinal ganglion cell 10"
+        parts = _TOKEN_SPLIT.split(word)
+        words.append(" ".join(abbreviations.get(part, part) for part in parts))
+    return " ".join(words)
+
+
+def tissue_terms(tissue_context: Optional[str]) -> List[str]:
+    """Split a tissue context such as "small intestine; colon" into normalized tissue names."""
+    if not tissue_context:
+        return []
+    return [normalize_term(t) for t in re.split(r"[;,]", tissue_context) if t.strip()]
+
+
+def swap_tissue_forms(text: str, tissues: List[str]) -> List[str]:
+    """
+    Rewrite between the 'X Y' and 'Y of X' forms, where X is a tissue and Y a cell type.
+
+    Args:
+        text: A normalized span.
+        tissues: Normalized tissue names known for the span, in addition to `TISSUE_ADJECTIVES`.
+
+    Returns:
+        The rewritten spans, including the cell type without its tissue.
+    """
+    variants = []
+    if " of " in text:
+        cell, tissue = text.split(" of ", 1)
+        tissue = re.sub(r"^the ", "", tissue)
+        variants.append(f"{tissue} {cell}")
+        adjectives = [adj for adj, noun in TISSUE_ADJECTIVES.items() if noun == tissue]
+        variants.extend(f"{adj} {cell}" for adj in adjectives)
+        variants.append(cell)
+        return variants
+    prefixes = sorted(set(tissues) | set(TISSUE_ADJECTIVES) | set(TISSUE_ADJECTIVES.values()), key=len, reverse=True)
+    for prefix in prefixes:
+        if text.startswith(prefix + " "):
+            cell = text[len(prefix) + 1:]
+            tissue = TISSUE_ADJECTIVES.get(prefix, prefix)
+            variants.extend([f"{cell} of {tissue}", f"{tissue} {cell}", cell])
+            break
+    return variants
+
+
+def generate_variants(text: str,
+                      tissue_context: Optional[str] = None,
+                      abbreviations: Optional[Dict[str, str]] = None,
+                      max_variants: int = 12) -> List[str]:
+    """
+    Generate search queries for a cell type span.
+
+    Variants cover the singular form, expanded abbreviations, 'X Y' <-> 'Y of X' rewrites and
+    tissue prefixes taken from the tissue context, in that order of preference.
+
+    Args:
+        text: The span, e.g. "SI_TA" or "Colonic goblet cells".
+        tissue_context: Tissues the cell type was identified in, separated by semicolons.
+        abbreviations: Lower case abbreviations and their expansions, defaults to `DEFAULT_ABBREVIATIONS`.
+        max_variants: Maximum number of variants returned.
+
+    Returns:
+        The distinct variants, starting with the normalized span.
+    """
+    if abbreviations is None:
+        abbreviations = DEFAULT_ABBREVIATIONS
+    tissues = tissue_terms(tissue_context)
+    base = normalize_term(text)
+    singular = singularize_phrase(base)
+    expanded = singularize_phrase(expand_abbreviations(base, abbreviations))
+    if expanded != singular and not _mentions_cell_noun(expanded) and not expanded.split(" ")[-1].isdigit():
+        expanded = f"{expanded} cell"
+
+    # tissue rewrites only make sense once abbreviations are expanded
+    variants = [base, singular, expanded]
+    swapped = swap_tissue_forms(expanded, tissues)
+    variants.extend(swapped)
+    if not swapped:
+        for tissue in tissues:
+            variants.extend([f"{expanded} of {tissue}", f"{tissue} {expanded}"])
+    return list(dict.fromkeys(v for v in variants if v))[:max_variants]
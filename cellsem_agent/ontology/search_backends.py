@@ -0,0 +1,169 @@
+"""
+Search backends used by the `search_cl` tool.
+"""
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, List, Optional, Tuple
+
+from .adapter_pool import get_shared_adapter
+from .cl_index import CLIndex
+from .search_config import get_config
+
+if TYPE_CHECKING:
+    from .search_cache import SearchCache
+
+logger = logging.getLogger(__name__)
+
+OBO_SELECTOR_PREFIX = "obo:"
+
+
+class SearchBackend(ABC):
+    """A source of Cell Ontology search results."""
+
+    selector: str
+    # Ontology version the results come from, part of the search cache key when known.
+    version: Optional[str] = None
+
+    @abstractmethod
+    def search(self, term: str) -> List[Tuple[str, str]]:
+        """
+        Search the ontology for a term.
+
+        Args:
+            term: The term to search for.
+
+        Returns:
+            A list of tuples, each containing a CL ID and a label.
+        """
+
+
+class OakSearchBackend(SearchBackend):
+    """
+    Search through an oaklib adapter, e.g. the OLS service or a local semsql file.
+
+    The adapter comes from the process-wide pool so it is only set up once.
+    """
+
+    def __init__(self, selector: str):
+        self.selector = selector
+        local_path = selector[len("sqlite:"):] if selector.startswith("sqlite:") else None
+        if local_path and os.path.exists(local_path):
+            self.version = str(int(os.path.getmtime(local_path)))
+
+    @property
+    def adapter(self) -> Any:
+        return get_shared_adapter(self.selector)
+
+    def search(self, term: str) -> List[Tuple[str, str]]:
+        adapter = self.adapter
+        results = adapter.basic_search(term)
+        return list(adapter.labels(results))
+
+
+class IndexSearchBackend(SearchBackend):
+    """Search an in-memory `CLIndex`."""
+
+    def __init__(self, index: CLIndex, selector: str = "index", limit: int = 20):
+        self.selector = selector
+        self.index = index
+        self.limit = limit
+        self.version = index.version
+
+    def search(self, term: str) -> List[Tuple[str, str]]:
+        return self.index.search(term, limit=self.limit)
+
+
+@lru_cache(maxsize=None)
+def load_obo_index(path: str) -> CLIndex:
+    """Build the in-memory index for an OBO file once per process."""
+    return CLIndex.from_obo(path)
+
+
+def obo_path(selector: str) -> Optional[str]:
+    """Return the OBO file path of an in-memory index selector, or None for oaklib selectors."""
+    if selector.startswith(OBO_SELECTOR_PREFIX):
+        return selector[len(OBO_SELECTOR_PREFIX):]
+    if selector.endswith(".obo"):
+        return selector
+    return None
+
+
+def create_backend(selector: str, limit: int = 20) -> SearchBackend:
+    """
+    Create a search backend from a selector.
+
+    Args:
+        selector: 'obo:/path/to/cl.obo' (or a path ending in .obo) for the in-memory index,
+            otherwise an oaklib selector such as 'ols:cl' or 'sqlite:obo:cl'.
+        limit: Maximum number of candidates returned by the in-memory index.
+
+    Returns:
+        The search backend.
+    """
+    path = obo_path(selector)
+    if path:
+        return IndexSearchBackend(load_obo_index(path), selector=selector, limit=limit)
+    return OakSearchBackend(selector)
+
+
+def has_local_index() -> bool:
+    """Tell whether a local index is configured, without loading it."""
+    config = get_config()
+    return bool(config.local_index or obo_path(config.backend))
+
+
+def get_local_index() -> Optional[CLIndex]:
+    """
+    Get the in-memory index used for deterministic grounding, if one is configured.
+
+    Returns:
+        The index built from `SearchConfig.local_index`, or from the backend when it is an
+        obo file, otherwise None.
+    """
+    config = get_config()
+    path = config.local_index or obo_path(config.backend)
+    return load_obo_index(path) if path else None
+
+
+_backend: Optional[SearchBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_search_backend() -> SearchBackend:
+    """
+    Get the configured search backend, creating it on first use.
+
+    Remote and sqlite backends are wrapped in the persistent search cache unless it is disabled;
+    the in-memory index is already faster than the cache.
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                config = get_config()
+                logger.info(f"Using Cell Ontology search backend: {config.backend}")
+                backend = create_backend(config.backend, limit=config.limit)
+                if config.cache and not isinstance(backend, IndexSearchBackend):
+                    from .search_cache import CachedSearchBackend
+
+                    backend = CachedSearchBackend(backend, get_search_cache())
+                _backend = backend
+    return _backend
+
+
+def get_search_cache() -> "SearchCache":
+    """Open the persistent search cache configured in `SearchConfig`."""
+    from .search_cache import SearchCache
+
+    config = get_config()
+    ttl = config.cache_ttl_days * 24 * 60 * 60 if config.cache_ttl_days else None
+    return SearchCache(config.cache_path, ttl=ttl, max_entries=config.cache_max_entries)
+
+
+def set_search_backend(backend: Optional[SearchBackend]) -> None:
+    """Override the search backend, e.g. in tests. Passing None restores the configured backend."""
+    global _backend
+    _backend = backend
@@ -0,0 +1,166 @@
+"""
+Persistent cache for ontology search results.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .cl_index import normalize_term
+from .search_backends import SearchBackend
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    created REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+class SearchCache:
+    """
+    A sqlite backed key/value cache with a time to live and least recently used eviction.
+
+    Hit and miss counters are kept both for the current process (`hits`, `misses`) and
+    persisted across runs (see `stats`).
+    """
+
+    def __init__(self, path: str, ttl: Optional[float] = None, max_entries: int = 100_000):
+        """
+        Args:
+            path: Path of the sqlite database file.
+            ttl: Time to live of an entry in seconds, None to keep entries until evicted.
+            max_entries: Number of entries kept; the least recently used ones are evicted beyond it.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._size = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for the key, or None on a miss or an expired entry."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._size -= 1
+                row = None
+            if row is None:
+                self.misses += 1
+                self._increment("misses")
+                return None
+            self.hits += 1
+            self._increment("hits")
+            self._conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Any) -> None:
+        """Store a JSON serializable value, evicting least recently used entries if the cache is full."""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO entries (key, value, created, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now))
+            if cursor.rowcount:
+                self._size += 1
+            else:
+                self._conn.execute("UPDATE entries SET value = ?, created = ?, last_access = ? WHERE key = ?",
+                                   (json.dumps(value), now, now, key))
+            if self._size > self.max_entries:
+                self._evict()
+
+    def _evict(self) -> None:
+        # evict a tenth beyond the limit so that eviction does not run on every insert
+        excess = self._size - self.max_entries + self.max_entries // 10
+        self._conn.execute(
+            "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY last_access LIMIT ?)", (excess,))
+        self._size = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        logger.debug(f"Evicted {excess} entries from {self.path}")
+
+    def _increment(self, counter: str) -> None:
+        self._conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (counter,))
+
+    def purge_expired(self) -> int:
+        """Delete expired entries and return how many were removed."""
+        if self.ttl is None:
+            return 0
+        with self._lock:
+            cursor = self._conn.execute("DELETE FROM entries WHERE created < ?", (time.time() - self.ttl,))
+            self._size -= cursor.rowcount
+        return cursor.rowcount
+
+    def clear(self) -> None:
+        """Delete all entries and reset the persisted counters."""
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.execute("DELETE FROM counters")
+            self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the cache location, size and persisted hit/miss counters."""
+        with self._lock:
+            counters = dict(self._conn.execute("SELECT name, value FROM counters").fetchall())
+            oldest, newest = self._conn.execute("SELECT MIN(created), MAX(created) FROM entries").fetchone()
+        return {
+            "path": self.path,
+            "entries": self._size,
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "oldest": oldest,
+            "newest": newest,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class CachedSearchBackend(SearchBackend):
+    """Memoize the results of another backend in a `SearchCache`."""
+
+    def __init__(self, backend: SearchBackend, cache: SearchCache):
+        self.backend = backend
+        self.cache = cache
+        self.selector = backend.selector
+        self.version = backend.version
+
+    def cache_key(self, term: str) -> str:
+        """Key a search on the backend, the ontology version and the normalized term."""
+        return f"{self.selector}|{self.version or ''}|{normalize_term(term)}"
+
+    def search(self, term: str) -> List[Tuple[str, str]]:
+        key = self.cache_key(term)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return [tuple(result) for result in cached]
+        results = self.backend.search(term)
+        self.cache.put(key, results)
+        return results
@@ -0,0 +1,83 @@
+"""
+Configuration for Cell Ontology search.
+"""
+import os
+from dataclasses import dataclass, field
+from typing import Optional
+
+from cellsem_agent.file_utils import get_cache_dir
+
+
+@dataclass
+class SearchConfig:
+
+    backend: str = field(
+        default="ols:cl",
+        metadata={
+            "description": "Backend used by search_cl. Either an oaklib selector (e.g. 'ols:cl', "
+                           "'sqlite:obo:cl', 'sqlite:/path/to/cl.db') or 'obo:/path/to/cl.obo' for the "
+                           "in-memory index. Default is ols:cl."}
+    )
+    local_index: Optional[str] = field(
+        default=None,
+        metadata={"description": "Path to a local cl.obo used for deterministic grounding before the LLM. "
+                                 "Defaults to the backend file when the backend is an obo file."}
+    )
+    limit: int = field(
+        default=20,
+        metadata={"description": "Maximum number of candidates returned by the in-memory index. Default is 20."}
+    )
+    max_workers: int = field(
+        default=8,
+        metadata={"description": "Number of threads running blocking searches for the async tools. Default is 8."}
+    )
+    cache: bool = field(
+        default=True,
+        metadata={"description": "Whether to memoize search results in a persistent cache. Default is True."}
+    )
+    cache_path: Optional[str] = field(
+        default=None,
+        metadata={"description": "Path of the sqlite search cache. Default is cl_search.sqlite in the shared cache dir."}
+    )
+    cache_ttl_days: float = field(
+        default=30,
+        metadata={"description": "Days before a cached search result expires, 0 to never expire. Default is 30."}
+    )
+    cache_max_entries: int = field(
+        default=100_000,
+        metadata={"description": "Number of cached searches kept before LRU eviction. Default is 100000."}
+    )
+
+    def __post_init__(self):
+        """Initialize the config with default values."""
+        if self.cache_path is None:
+            self.cache_path = os.path.join(get_cache_dir(create=False), "cl_search.sqlite")
+
+
+def get_config() -> SearchConfig:
+    """
+    Get the Cell Ontology search configuration from environment variables or defaults.
+
+    Environment variables:
+        CL_SEARCH_BACKEND: backend selector, see `SearchConfig.backend`.
+        CL_LOCAL_INDEX: path to a local cl.obo used for deterministic grounding.
+        CL_SEARCH_LIMIT: maximum number of candidates returned by the in-memory index.
+        CL_SEARCH_MAX_WORKERS: number of threads running blocking searches.
+        CL_SEARCH_CACHE: set to 0 to disable the persistent search cache.
+        CL_SEARCH_CACHE_PATH: path of the sqlite search cache.
+        CL_SEARCH_CACHE_TTL_DAYS: days before a cached result expires.
+        CL_SEARCH_CACHE_MAX_ENTRIES: number of cached searches kept.
+
+    Returns:
+        A SearchConfig instance.
+    """
+    config = SearchConfig()
+    config.backend = os.environ.get("CL_SEARCH_BACKEND", config.backend)
+    config.local_index = os.environ.get("CL_LOCAL_INDEX", config.local_index)
+    config.limit = int(os.environ.get("CL_SEARCH_LIMIT", config.limit))
+    config.max_workers = int(os.environ.get("CL_SEARCH_MAX_WORKERS", config.max_workers))
+    config.cache = os.environ.get("CL_SEARCH_CACHE", "1").lower() not in ("0", "false", "no")
+    config.cache_path = os.environ.get("CL_SEARCH_CACHE_PATH", config.cache_path)
+    config.cache_ttl_days = float(os.environ.get("CL_SEARCH_CACHE_TTL_DAYS", config.cache_ttl_days))
+    config.cache_max_entries = int(os.environ.get("CL_SEARCH_CACHE_MAX_ENTRIES", config.cache_max_entries))
+    return config
@@ -0,0 +1,143 @@
+"""
+TF-IDF nearest neighbour search over Cell Ontology labels, synonyms and definitions.
+"""
+import logging
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from .cl_index import CLIndex, normalize_term
+from .search_backends import get_local_index
+
+logger = logging.getLogger(__name__)
+
+
+class TfidfIndex:
+    """
+    Vector space index scoring spans against every label, synonym and definition at once.
+
+    Each document is embedded as the concatenation of a character n-gram and a word n-gram
+    TF-IDF vector, scaled so that the dot product of two documents is the weighted sum of their
+    character and word cosine similarities. Queries are scored with one sparse matrix product.
+    """
+
+    def __init__(self, index: CLIndex, char_weight: float = 0.7, definition_weight: float = 0.5,
+                 use_definitions: bool = True):
+        """
+        Args:
+            index: The ontology index providing labels, synonyms and definitions.
+            char_weight: Weight of the character n-gram similarity, the rest goes to word n-grams.
+            definition_weight: Factor applied to the scores of definition documents.
+            use_definitions: Whether definitions are indexed.
+        """
+        self.index = index
+        self.char_weight = char_weight
+        texts = []
+        term_ids = []
+        weights = []
+        for term in index.terms.values():
+            names = [term.label] + [synonym for _, synonym in term.synonyms]
+            for name in dict.fromkeys(names):
+                texts.append(name)
+                term_ids.append(term.id)
+                weights.append(1.0)
+            if use_definitions and term.definition:
+                texts.append(term.definition)
+                term_ids.append(term.id)
+                weights.append(definition_weight)
+        self.term_ids = np.array(term_ids, dtype=object)
+        self.char_vectorizer = TfidfVectorizer(analyzer="char_wb", ngram_range=(2, 4), sublinear_tf=True,
+                                               preprocessor=normalize_term, dtype=np.float32)
+        self.word_vectorizer = TfidfVectorizer(analyzer="word", ngram_range=(1, 2), sublinear_tf=True,
+                                               preprocessor=normalize_term, dtype=np.float32)
+        documents = self._combine(self.char_vectorizer.fit_transform(texts),
+                                  self.word_vectorizer.fit_transform(texts))
+        # document weights are folded into the transposed matrix so scoring is a single product
+        self._matrix_t = (sparse.diags(np.array(weights, dtype=np.float32)) @ documents).T.tocsr()
+        logger.info(f"Built TF-IDF index over {len(texts)} documents of {len(index)} terms")
+
+    def _combine(self, char_vectors: sparse.spmatrix, word_vectors: sparse.spmatrix) -> sparse.csr_matrix:
+        return sparse.hstack([char_vectors * np.sqrt(self.char_weight),
+                              word_vectors * np.sqrt(1 - self.char_weight)]).tocsr()
+
+    def transform(self, spans: List[str]) -> sparse.csr_matrix:
+        """Embed spans in the index vector space."""
+        return self._combine(self.char_vectorizer.transform(spans), self.word_vectorizer.transform(spans))
+
+    def query(self, spans: List[str], k: int = 5, min_score: float = 0.3,
+              batch_size: int = 256) -> List[List[Tuple[str, str, float]]]:
+        """
+        Find the k most similar terms for each span.
+
+        Args:
+            spans: The spans to ground, e.g. the full_name column of a dataset.
+            k: Number of terms returned per span.
+            min_score: Minimum similarity of a returned term.
+            batch_size: Number of spans scored per matrix product, bounding the memory of the score matrix.
+
+        Returns:
+            For each span, a list of tuples of a CL ID, its label and the similarity, best first.
+        """
+        results = []
+        for offset in range(0, len(spans), batch_size):
+            scores = (self.transform(spans[offset:offset + batch_size]) @ self._matrix_t).tocsr()
+            results.extend(self._top_terms(scores, k, min_score))
+        return results
+
+    def _top_terms(self, scores: sparse.csr_matrix, k: int, min_score: float) -> List[List[Tuple[str, str, float]]]:
+        # a term can match through several documents, so more than k documents are considered
+        per_row = k * 4
+        results = []
+        for row in range(scores.shape[0]):
+            start, end = scores.indptr[row], scores.indptr[row + 1]
+            data = scores.data[start:end]
+            columns = scores.indices[start:end]
+            if len(data) > per_row:
+                top = np.argpartition(-data, per_row)[:per_row]
+                data, columns = data[top], columns[top]
+            best = {}
+            for column, score in sorted(zip(columns, data), key=lambda item: -item[1]):
+                if score < min_score or len(best) == k:
+                    break
+                best.setdefault(self.term_ids[column], float(score))
+            results.append([(term_id, self.index.terms[term_id].label, round(score, 3))
+                            for term_id, score in best.items()])
+        return results
+
+
+_tfidf_index: Optional[TfidfIndex] = None
+_lock = threading.Lock()
+
+
+def get_tfidf_index() -> Optional[TfidfIndex]:
+    """Get the TF-IDF index over the configured local CL index, built on first use."""
+    global _tfidf_index
+    if _tfidf_index is None:
+        cl_index = get_local_index()
+        if cl_index is None:
+            return None
+        with _lock:
+            if _tfidf_index is None:
+                _tfidf_index = TfidfIndex(cl_index)
+    return _tfidf_index
+
+
+def ground_spans(spans: List[str], k: int = 5, min_score: float = 0.3) -> List[List[Tuple[str, str, float]]]:
+    """
+    Return the top k CL terms for many spans at once using the TF-IDF index.
+
+    Args:
+        spans: The spans to ground.
+        k: Number of terms returned per span.
+        min_score: Minimum similarity of a returned term.
+
+    Returns:
+        For each span, a list of tuples of a CL ID, its label and the similarity, best first.
+    """
+    tfidf_index = get_tfidf_index()
+    if tfidf_index is None:
+        raise ValueError("No local Cell Ontology index configured, set CL_LOCAL_INDEX to a cl.obo file.")
+    return tfidf_index.query(spans, k=k, min_score=min_score)
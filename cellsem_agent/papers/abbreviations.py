@@ -0,0 +1,189 @@
+"""
+Rule based extraction of abbreviations and synonyms from paper text.
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Phrases introducing an alternative name, e.g. "M cells, also known as microfold cells"
+SYNONYM_CUES = ("also known as", "also called", "also termed", "also referred to as", "referred to as", "hereafter called",
+                "termed")
+
+_PARENTHESIS = re.compile(r"\(([^()]{1,60})\)")
+_SENTENCE_BREAK = re.compile(r"[.;:!?()\[\]]")
+_SYNONYM_PATTERN = re.compile(
+    r"(?P<term>[A-Za-z0-9+\-/ ]{3,80}?)\s*,?\s*\(?\s*(?:" + "|".join(SYNONYM_CUES) + r")\s+(?:the\s+)?[\"“']?"
+    r"(?P<synonym>[A-Za-z0-9+\-/ ]{2,60}?)[\"”']?(?=\s*[,.;)]|\s+(?:and|or|which|that|in|were|are)\b)")
+_LEADING_WORDS = re.compile(r"^(?:(?:the|a|an|these|those|of|and|or|we|which|cells?)\s+)+", re.IGNORECASE)
+_FRAGMENT_SPLIT = re.compile(r"[\s_\-/.,]+|(?<=[a-z])(?=[A-Z])")
+_NUMBER_SUFFIX = re.compile(r"^(?P<prefix>.*?[A-Za-z])(?P<number>\d+[a-z]?)$")
+MAX_SYNONYM_TERM_WORDS = 5
+# Keyed definitions listed in a parenthesis, e.g. "(F-fovea, P-peripheral)"
+_KEYED_ITEM = re.compile(r"^(?P<short>[A-Z][A-Za-z0-9]{0,4})\s*[-=:]\s*(?P<long>[A-Za-z][\w\- ]{2,60})$")
+# Words that name a cell type on their own, e.g. "cell", "enterocyte", "fibroblast", "macrophage"
+_CELL_HEAD_NOUN = re.compile(r"^(?:cells?|neurons?|\w*(?:cytes?|blasts?|phages?|clasts?))$", re.IGNORECASE)
+
+
+def _normalize_space(text: str) -> str:
+    return re.sub(r"\s+", " ", text)
+
+
+def _is_short_form(candidate: str) -> bool:
+    return (2 <= len(candidate) <= 10 and len(candidate.split()) <= 2 and candidate[0].isalnum()
+            and any(c.isalpha() for c in candidate))
+
+
+def best_long_form(short_form: str, long_form: str) -> Optional[str]:
+    """
+    Find the shortest end of a candidate long form that matches a short form (Schwartz and Hearst, 2003).
+
+    Every letter and digit of the short form must appear in order in the long form, and the
+    first one must start a word.
+
+    Args:
+        short_form: The abbreviation, e.g. "FAE".
+        long_form: The words preceding it, e.g. "cells of the follicle-associated epithelium".
+
+    Returns:
+        The matching long form, e.g. "follicle-associated epithelium", or None.
+    """
+    short_index = len(short_form) - 1
+    long_index = len(long_form) - 1
+    while short_index >= 0:
+        c = short_form[short_index].lower()
+        if not c.isalnum():
+            short_index -= 1
+            continue
+        while long_index >= 0 and (long_form[long_index].lower() != c or (
+                short_index == 0 and long_index > 0 and long_form[long_index - 1].isalnum())):
+            long_index -= 1
+        if long_index < 0:
+            return None
+        long_index -= 1
+        short_index -= 1
+    start = long_form.rfind(" ", 0, long_index + 1) + 1
+    result = long_form[start:].strip()
+    if len(result) <= len(short_form) or short_form.lower() in result.lower().split():
+        return None
+    return result
+
+
+def find_abbreviations(text: str) -> Dict[str, str]:
+    """
+    Find the abbreviations defined in a text as "long form (SF)", "SF (long form)" or in a keyed
+    list such as "(F-fovea, P-peripheral)".
+
+    Args:
+        text: The text of a paper.
+
+    Returns:
+        The short forms and their long forms; the first definition of a short form is kept.
+    """
+    text = _normalize_space(text)
+    abbreviations: Dict[str, str] = {}
+    for match in _PARENTHESIS.finditer(text):
+        items = [item.strip() for item in re.split(r"[,;]", match.group(1))]
+        keyed = [match for match in map(_KEYED_ITEM.match, items) if match]
+        if len(items) > 1 and len(keyed) == len(items):
+            for item in keyed:
+                long_form = best_long_form(item.group("short"), item.group("long").strip())
+                if long_form:
+                    abbreviations.setdefault(item.group("short"), long_form)
+            continue
+        inside = re.split(r"[,;] ", match.group(1).strip())[0].strip()
+        before = text[:match.start()]
+        before = before[max((m.end() for m in _SENTENCE_BREAK.finditer(before)), default=0):].strip()
+        if not before:
+            continue
+        if _is_short_form(inside):
+            short_form = inside
+            words = before.split()
+            window = min(len(short_form) + 5, len(short_form) * 2)
+            long_form = best_long_form(short_form, " ".join(words[-window:]))
+        elif len(inside.split()) > 1 and _is_short_form(before.split()[-1]):
+            # reversed form: "FAE (follicle-associated epithelium)"
+            short_form = before.split()[-1]
+            long_form = best_long_form(short_form, inside)
+        else:
+            continue
+        if long_form:
+            abbreviations.setdefault(short_form, long_form)
+    return abbreviations
+
+
+def find_synonyms(text: str) -> List[Tuple[str, str]]:
+    """
+    Find names introduced by cues such as "also known as" or "referred to as" (see `SYNONYM_CUES`).
+
+    Args:
+        text: The text of a paper.
+
+    Returns:
+        (term, synonym) pairs in text order.
+    """
+    pairs = []
+    for match in _SYNONYM_PATTERN.finditer(_normalize_space(text)):
+        term = " ".join(match.group("term").split()[-MAX_SYNONYM_TERM_WORDS:])
+        term = _LEADING_WORDS.sub("", term).strip(" -/")
+        synonym = match.group("synonym").strip(" -/")
+        if not _LEADING_WORDS.sub("", term + " ").strip():
+            continue
+        if term and synonym and term.lower() != synonym.lower():
+            pairs.append((term, synonym))
+    return pairs
+
+
+def _lookup(fragment: str, abbreviations: Dict[str, str],
+            folded: Dict[str, str]) -> Optional[str]:
+    return abbreviations.get(fragment) or folded.get(fragment.casefold())
+
+
+def expand_label(label: str, abbreviations: Dict[str, str]) -> Optional[str]:
+    """
+    Expand a cell type label with the abbreviations defined in its paper.
+
+    A label defined as a whole is replaced by its definition. Otherwise every fragment is
+    expanded: lower case words are kept, abbreviations are replaced by their long form and an
+    abbreviation followed by a number keeps the number ("RGC10" -> "retinal ganglion cell 10").
+
+    Args:
+        label: A cc.label such as "SI_TA".
+        abbreviations: Short forms and long forms, e.g. from `find_abbreviations`.
+
+    Returns:
+        The expanded label, or None if a fragment is neither a word nor a known abbreviation.
+    """
+    folded: Dict[str, str] = {}
+    for short_form, long_form in abbreviations.items():
+        folded.setdefault(short_form.casefold(), long_form)
+    whole = _lookup(label, abbreviations, folded) or _lookup(label.replace("_", " "), abbreviations, folded)
+    if whole:
+        return whole
+
+    words = []
+    expanded = False
+    for fragment in filter(None, _FRAGMENT_SPLIT.split(label)):
+        expansion = _lookup(fragment, abbreviations, folded)
+        if expansion:
+            words.append(expansion)
+            expanded = True
+            continue
+        numbered = _NUMBER_SUFFIX.match(fragment)
+        if numbered and _lookup(numbered.group("prefix"), abbreviations, folded):
+            words.append(f"{_lookup(numbered.group('prefix'), abbreviations, folded)} {numbered.group('number')}")
+            expanded = True
+        elif fragment.islower() and fragment.isalpha() and len(fragment) > 2:
+            words.append(fragment)
+        else:
+            return None
+    return " ".join(words) if expanded else None
+
+
+def with_cell_head_noun(name: str) -> str:
+    """
+    Add "cell" to the expansion of a cell type label that has no cell head noun, e.g.
+    "small intestine transit amplifying" -> "small intestine transit amplifying cell".
+    Names such as "retinal ganglion cell 10" or "colonocyte" are returned unchanged.
+    """
+    if any(_CELL_HEAD_NOUN.match(word) for word in re.split(r"[\s\-/]+", name)):
+        return name
+    return f"{name} cell"
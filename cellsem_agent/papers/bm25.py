@@ -0,0 +1,69 @@
+"""
+Okapi BM25 ranking over a small in-memory collection of passages.
+"""
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Sequence, Tuple
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Split a text into lower case alphanumeric tokens."""
+    return _TOKEN.findall(text.lower())
+
+
+class BM25Index:
+    """
+    Inverted index scoring documents with Okapi BM25.
+    """
+
+    def __init__(self, documents: Sequence[str], k1: float = 1.5, b: float = 0.75):
+        """
+        Args:
+            documents: The texts to index, referred to by their position.
+            k1: Term frequency saturation.
+            b: Strength of the document length normalization.
+        """
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self._lengths: List[int] = []
+        for i, document in enumerate(documents):
+            tokens = tokenize(document)
+            self._lengths.append(len(tokens))
+            for token, count in Counter(tokens).items():
+                self._postings[token].append((i, count))
+        self._average_length = sum(self._lengths) / len(self._lengths) if self._lengths else 0.0
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def idf(self, token: str) -> float:
+        df = len(self._postings.get(token, ()))
+        return math.log(1 + (len(self) - df + 0.5) / (df + 0.5))
+
+    def scores(self, query: Sequence[str]) -> Dict[int, float]:
+        """Return the BM25 score of every document containing at least one query token."""
+        scores: Dict[int, float] = defaultdict(float)
+        for token in dict.fromkeys(query):
+            idf = self.idf(token)
+            for i, count in self._postings.get(token, ()):
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[i] / self._average_length)
+                scores[i] += idf * count * (self.k1 + 1) / (count + norm)
+        return scores
+
+    def search(self, query: Sequence[str], limit: int = 5) -> List[Tuple[int, float]]:
+        """
+        Rank documents for a tokenized query.
+
+        Args:
+            query: The query tokens, e.g. from `tokenize`.
+            limit: Maximum number of results.
+
+        Returns:
+            A list of (document position, score) tuples, best first.
+        """
+        ranked = sorted(self.scores(query).items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit]
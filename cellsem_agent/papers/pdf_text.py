@@ -0,0 +1,280 @@
+"""
+PDF text extraction with parallel page extraction and an on-disk text cache.
+"""
+import json
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import fitz
+
+from cellsem_agent.file_utils import file_sha256, get_cache_dir
+
+logger = logging.getLogger(__name__)
+
+# Documents with fewer pages are extracted in the calling process
+PARALLEL_MIN_PAGES = 40
+# Number of consecutive pages extracted per worker task
+PAGES_PER_TASK = 16
+MAX_WORKERS = os.cpu_count() or 1
+
+# Section titles of papers and supplements, matched case-insensitively against whole lines
+SECTION_TITLES = (
+    "abstract", "summary", "introduction", "background", "results", "discussion", "conclusion", "conclusions",
+    "methods", "materials and methods", "star methods", "method details", "experimental procedures",
+    "references", "acknowledgements", "acknowledgments", "author contributions", "declaration of interests",
+    "key resources table", "figure legends", "supplementary information", "supplemental information",
+)
+_NUMBERED_HEADING = re.compile(r"^\d{1,2}(\.\d{1,2})*\.?\s+[A-Z][A-Za-z ,\-/()]{2,70}$")
+_SUPPLEMENT_HEADING = re.compile(r"^(supplementary|supplemental)\s+(figure|table|note|data|methods)\b.{0,60}$",
+                                 re.IGNORECASE)
+MAX_HEADING_WORDS = 10
+
+
+@dataclass
+class PdfPage:
+    number: int
+    text: str
+    headings: List[str] = field(default_factory=list)
+
+
+@dataclass
+class PdfSection:
+    title: str
+    first_page: int
+    last_page: int
+    text: str
+
+
+_memo: Dict[Tuple[str, int, int], List[str]] = {}
+_memo_lock = threading.Lock()
+
+
+def _extract_range(pdf_path: str, start: int, end: int) -> List[str]:
+    """Extract the text of pages [start, end) of a PDF, run in worker processes."""
+    with fitz.open(pdf_path) as doc:
+        return [doc[number].get_text("text") for number in range(start, end)]
+
+
+def extract_pages(pdf_path: str, max_workers: Optional[int] = None) -> List[str]:
+    """
+    Extract the text of every page of a PDF, without caching.
+
+    Documents of at least `PARALLEL_MIN_PAGES` pages are split into ranges of `PAGES_PER_TASK`
+    pages extracted by a process pool.
+
+    Args:
+        pdf_path: The path to the PDF file.
+        max_workers: Number of worker processes, defaults to `MAX_WORKERS`.
+
+    Returns:
+        The text of each page, in page order.
+    """
+    max_workers = max_workers or MAX_WORKERS
+    with fitz.open(pdf_path) as doc:
+        page_count = doc.page_count
+    if page_count < PARALLEL_MIN_PAGES or max_workers == 1:
+        return _extract_range(pdf_path, 0, page_count)
+
+    starts = list(range(0, page_count, PAGES_PER_TASK))
+    ends = [min(start + PAGES_PER_TASK, page_count) for start in starts]
+    pages = []
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(starts))) as executor:
+        for chunk in executor.map(_extract_range, [pdf_path] * len(starts), starts, ends):
+            pages.extend(chunk)
+    logger.info(f"Extracted {page_count} pages of {pdf_path} in {len(starts)} parallel tasks")
+    return pages
+
+
+def _cache_path(pdf_path: str) -> str:
+    # the extractor version is part of the key as text output can change between PyMuPDF releases
+    key = f"{file_sha256(pdf_path)}-{fitz.VersionBind}"
+    return os.path.join(get_cache_dir("pdf_text"), key + ".jsonl")
+
+
+def _memo_key(pdf_path: str) -> Tuple[str, int, int]:
+    stat = os.stat(pdf_path)
+    return os.path.realpath(pdf_path), stat.st_mtime_ns, stat.st_size
+
+
+def get_pages(pdf_path: str) -> List[str]:
+    """
+    Get the text of every page of a PDF, extracting it only once per file content.
+
+    Page texts are kept in memory for the life of the process and on disk in the
+    `pdf_text` cache dir, keyed on the SHA-256 of the file, so copies of the same PDF in
+    several dataset folders are extracted once.
+
+    Args:
+        pdf_path: The path to the PDF file.
+
+    Returns:
+        The text of each page, in page order.
+    """
+    memo_key = _memo_key(pdf_path)
+    with _memo_lock:
+        if memo_key in _memo:
+            return _memo[memo_key]
+
+    cache_path = _cache_path(pdf_path)
+    if os.path.exists(cache_path):
+        logger.info(f"Using cached text of {pdf_path}")
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            pages = [json.loads(line) for line in f]
+    else:
+        pages = extract_pages(pdf_path)
+        # one JSON string per line keeps the cache file readable page by page
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for page in pages:
+                f.write(json.dumps(page) + "\n")
+        os.replace(tmp_path, cache_path)
+
+    with _memo_lock:
+        _memo[memo_key] = pages
+    return pages
+
+
+def get_text(pdf_path: str) -> str:
+    """Get the full text of a PDF, pages separated by newlines."""
+    return "\n".join(get_pages(pdf_path))
+
+
+def detect_headings(text: str) -> List[str]:
+    """
+    Find the lines of a page that look like section headings.
+
+    Headings are short lines without a final full stop that are a known section title
+    (see `SECTION_TITLES`), a numbered title such as "2.1 Tissue processing" or a supplementary
+    figure or table caption start.
+
+    Args:
+        text: The text of a page.
+
+    Returns:
+        The heading lines, in page order.
+    """
+    headings = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.endswith(".") or len(line.split()) > MAX_HEADING_WORDS:
+            continue
+        if (line.casefold().rstrip(":") in SECTION_TITLES or _NUMBERED_HEADING.match(line)
+                or _SUPPLEMENT_HEADING.match(line)):
+            headings.append(line)
+    return headings
+
+
+def _iter_page_texts(pdf_path: str, first_page: int, last_page: Optional[int]) -> Iterator[Tuple[int, str]]:
+    start = first_page - 1
+    with _memo_lock:
+        pages = _memo.get(_memo_key(pdf_path))
+    if pages is not None:
+        yield from enumerate(pages[start:last_page], first_page)
+        return
+    cache_path = _cache_path(pdf_path)
+    if os.path.exists(cache_path):
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            for number, line in enumerate(islice(f, start, last_page), first_page):
+                yield number, json.loads(line)
+        return
+    with fitz.open(pdf_path) as doc:
+        end = doc.page_count if last_page is None else min(last_page, doc.page_count)
+        for number in range(start, end):
+            yield number + 1, doc[number].get_text("text")
+
+
+def iter_pages(pdf_path: str, first_page: int = 1, last_page: Optional[int] = None) -> Iterator[PdfPage]:
+    """
+    Lazily yield the pages of a PDF with their detected headings.
+
+    Pages are read from the in-memory or on-disk text cache when the document was extracted
+    before, and extracted one at a time otherwise, so only the pages consumed are held in memory.
+
+    Args:
+        pdf_path: The path to the PDF file.
+        first_page: Number of the first page yielded, starting at 1.
+        last_page: Number of the last page yielded (inclusive), defaults to the last page of the document.
+
+    Yields:
+        The pages in order.
+    """
+    if first_page < 1:
+        raise ValueError(f"Page numbers start at 1, got first_page={first_page}")
+    for number, text in _iter_page_texts(pdf_path, first_page, last_page):
+        yield PdfPage(number, text, detect_headings(text))
+
+
+def iter_sections(pdf_path: str, first_page: int = 1, last_page: Optional[int] = None) -> Iterator[PdfSection]:
+    """
+    Lazily yield the sections of a PDF, split at the lines `detect_headings` finds.
+
+    Text before the first heading is yielded as a section with an empty title.
+
+    Args:
+        pdf_path: The path to the PDF file.
+        first_page: Number of the first page read, starting at 1.
+        last_page: Number of the last page read (inclusive), defaults to the last page of the document.
+
+    Yields:
+        The sections in order, each holding only its own text.
+    """
+    title = ""
+    start_page = first_page
+    number = first_page
+    lines: List[str] = []
+    for page in iter_pages(pdf_path, first_page, last_page):
+        number = page.number
+        headings = set(page.headings)
+        for line in page.text.splitlines():
+            if line.strip() in headings:
+                if lines or title:
+                    yield PdfSection(title, start_page, number, "\n".join(lines))
+                title = line.strip()
+                start_page = number
+                lines = []
+            else:
+                lines.append(line)
+    if lines or title:
+        yield PdfSection(title, start_page, number, "\n".join(lines))
+
+
+def iter_chunks(pdf_path: str, max_chars: int) -> Iterator[str]:
+    """
+    Lazily yield the text of a PDF in chunks of whole sections of at most `max_chars` characters.
+
+    Sections longer than `max_chars` are split between words.
+
+    Args:
+        pdf_path: The path to the PDF file.
+        max_chars: Maximum number of characters per chunk.
+
+    Yields:
+        The chunks in document order.
+    """
+    chunk: List[str] = []
+    size = 0
+    for section in iter_sections(pdf_path):
+        text = f"{section.title}\n{section.text}" if section.title else section.text
+        pieces = [text]
+        if len(text) > max_chars:
+            pieces, piece = [], ""
+            for word in text.split(" "):
+                if piece and len(piece) + len(word) + 1 > max_chars:
+                    pieces.append(piece)
+                    piece = ""
+                piece = f"{piece} {word}" if piece else word
+            pieces.append(piece)
+        for piece in pieces:
+            if chunk and size + len(piece) + 1 > max_chars:
+                yield "\n".join(chunk)
+                chunk, size = [], 0
+            chunk.append(piece)
+            size += len(piece) + 1
+    if chunk:
+        yield "\n".join(chunk)
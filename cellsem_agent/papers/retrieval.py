@@ -0,0 +1,128 @@
+"""
+Selection of the paper passages relevant to a set of cell type labels.
+"""
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+from .abbreviations import find_abbreviations
+from .bm25 import BM25Index, tokenize
+from .pdf_text import get_text, iter_sections
+
+WORDS_PER_PASSAGE = 150
+# Number of passages kept for each label and label fragment
+PASSAGES_PER_QUERY = 3
+MAX_PASSAGES = 120
+# Version of the passage selection rules, part of the paper expansion cache key in "retrieval" mode
+SELECTION_VERSION = 2
+
+_FRAGMENT_SPLIT = re.compile(r"[\s_\-/.,+]+|(?<=[a-z])(?=[A-Z])")
+
+
+@dataclass
+class Passage:
+    page: int
+    section: str
+    text: str
+
+
+def split_passages(pdf_path: str, words_per_passage: int = WORDS_PER_PASSAGE) -> List[Passage]:
+    """Split the sections of a PDF into passages of at most `words_per_passage` words."""
+    passages = []
+    for section in iter_sections(pdf_path):
+        words = section.text.split()
+        for start in range(0, len(words), words_per_passage):
+            passages.append(Passage(section.first_page, section.title, " ".join(words[start:start + words_per_passage])))
+    return passages
+
+
+def long_forms(label: str, abbreviations: Dict[str, str]) -> List[str]:
+    """
+    Find the long forms of a label and of its fragments, with or without trailing digits, e.g.
+    "conventional dendritic cell" for "cDC2" when the paper defines "cDC".
+    """
+    folded: Dict[str, str] = {}
+    for short_form, long_form in abbreviations.items():
+        folded.setdefault(short_form.casefold(), long_form)
+    candidates = [label, label.rstrip("0123456789")]
+    for fragment in filter(None, _FRAGMENT_SPLIT.split(label)):
+        candidates.extend([fragment, fragment.rstrip("0123456789")])
+    found = [abbreviations.get(candidate) or folded.get(candidate.casefold()) for candidate in candidates if candidate]
+    return list(dict.fromkeys(long_form for long_form in found if long_form))
+
+
+def label_queries(label: str, abbreviations: Optional[Dict[str, str]] = None) -> List[List[str]]:
+    """
+    Build the search queries of a cell type label: the whole label, then each of its fragments,
+    then the long forms the paper gives them.
+
+    A fragment with trailing digits, e.g. "RGC10", is also searched without them.
+
+    Args:
+        label: A cc.label such as "SI_TA" or "C_lateACC".
+        abbreviations: The abbreviations defined in the paper, see `find_abbreviations`.
+
+    Returns:
+        The tokenized queries, e.g. [["si", "ta"], ["si"], ["ta"]].
+    """
+    fragments = [tokenize(fragment) for fragment in _FRAGMENT_SPLIT.split(label)]
+    fragments = [tokens for tokens in fragments if tokens]
+    queries = [[token for tokens in fragments for token in tokens]]
+    if len(fragments) > 1:
+        queries.extend(fragments)
+    for tokens in fragments:
+        stems = [token.rstrip("0123456789") for token in tokens]
+        if stems != tokens and all(stems):
+            queries.append(stems)
+    if abbreviations:
+        # abbreviated labels such as "cDC2" rarely match the prose that describes the cell type
+        queries.extend(tokenize(long_form) for long_form in long_forms(label, abbreviations))
+    unique = {tuple(query): query for query in queries if query}
+    return list(unique.values())
+
+
+def select_passages(passages: Sequence[Passage], labels: Sequence[str],
+                    per_query: int = PASSAGES_PER_QUERY, max_passages: int = MAX_PASSAGES,
+                    abbreviations: Optional[Dict[str, str]] = None) -> List[Passage]:
+    """
+    Select the passages that best match the labels, their fragments and their long forms with BM25.
+
+    Args:
+        passages: The passages of a document.
+        labels: The cell type labels to find.
+        per_query: Number of passages kept per query.
+        max_passages: Maximum number of passages returned; the best scoring are kept.
+        abbreviations: The abbreviations defined in the paper, see `label_queries`.
+
+    Returns:
+        The selected passages, in document order.
+    """
+    index = BM25Index([passage.text for passage in passages])
+    best: Dict[int, float] = {}
+    for label in dict.fromkeys(labels):
+        for query in label_queries(label, abbreviations):
+            for i, score in index.search(query, per_query):
+                best[i] = max(score, best.get(i, 0.0))
+    kept = sorted(best, key=lambda i: (-best[i], i))[:max_passages]
+    return [passages[i] for i in sorted(kept)]
+
+
+def format_passages(passages: Sequence[Passage]) -> str:
+    """Join passages into prompt text, each headed by its page and section."""
+    blocks = []
+    for passage in passages:
+        heading = f"[page {passage.page}" + (f", {passage.section}]" if passage.section else "]")
+        blocks.append(f"{heading}\n{passage.text}")
+    return "\n\n".join(blocks)
+
+
+def relevant_text(pdf_path: str, labels: Sequence[str], abbreviations: Optional[Dict[str, str]] = None) -> str:
+    """
+    Return the passages of a PDF relevant to a set of labels, formatted for a prompt.
+
+    The labels are also searched by the long forms of `abbreviations`, by default the ones the
+    PDF defines.
+    """
+    if abbreviations is None:
+        abbreviations = find_abbreviations(get_text(pdf_path))
+    return format_passages(select_passages(split_passages(pdf_path), labels, abbreviations=abbreviations))
@@ -0,0 +1,52 @@
+import os
+
+from cellsem_agent.papers import pdf_text
+from cellsem_agent.papers.abbreviations import expand_label, find_abbreviations, find_synonyms, with_cell_head_noun
+from cellsem_agent.papers.pdf_text import get_text
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "test_data", "cell_mappings_input")
+
+TEXT = """We profiled the small intestine (SI) and colon. Cells of the follicle-associated
+epithelium (FAE) and transit amplifying (TA) cells were abundant, as were
+RGC (retinal ganglion cell) types. M cells, also known as microfold cells, were rare."""
+
+
+def test_find_abbreviations():
+    assert find_abbreviations(TEXT) == {
+        "SI": "small intestine",
+        "FAE": "follicle-associated epithelium",
+        "TA": "transit amplifying",
+        "RGC": "retinal ganglion cell",
+    }
+
+
+def test_find_synonyms():
+    assert find_synonyms(TEXT) == [("M cells", "microfold cells")]
+
+
+def test_expand_label():
+    abbreviations = find_abbreviations(TEXT)
+    assert expand_label("SI_TA", abbreviations) == "small intestine transit amplifying"
+    assert expand_label("RGC10", abbreviations) == "retinal ganglion cell 10"
+    assert expand_label("SI_goblet", abbreviations) == "small intestine goblet"
+    assert expand_label("C_tuft", abbreviations) is None
+
+
+def test_with_cell_head_noun():
+    abbreviations = find_abbreviations(TEXT)
+    assert with_cell_head_noun(expand_label("SI_TA", abbreviations)) == "small intestine transit amplifying cell"
+    assert with_cell_head_noun(expand_label("RGC10", abbreviations)) == "retinal ganglion cell 10"
+    assert with_cell_head_noun("colonocytes") == "colonocytes"
+    assert with_cell_head_noun("skin fibroblast") == "skin fibroblast"
+
+
+def test_abbreviations_of_repo_supplements(tmp_path, monkeypatch):
+    monkeypatch.setenv("CELLSEM_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(pdf_text, "_memo", {})
+    # the retina supplement defines its sample regions in a keyed list: "(F-fovea, P-peripheral)"
+    retina = get_text(os.path.join(DATA_DIR, "Bipolar_cells", "Yan_et_al(2020)_suppl_material.pdf"))
+    assert find_abbreviations(retina) == {"F": "fovea", "P": "peripheral"}
+    # the gut supplement is a single figure without definitions, its labels are left to the agent
+    gut = get_text(os.path.join(DATA_DIR, "gut", "Burclaff_et_al._(2022)_supp_material.pdf"))
+    assert find_abbreviations(gut) == {}
+    assert expand_label("SI_TA", find_abbreviations(gut)) is None
@@ -0,0 +1,32 @@
+import threading
+
+from cellsem_agent.ontology import adapter_pool
+from cellsem_agent.ontology.adapter_pool import get_shared_adapter
+
+
+def test_adapters_are_shared_per_selector(monkeypatch):
+    created = []
+
+    def get_adapter(selector):
+        created.append(selector)
+        return object()
+
+    monkeypatch.setattr("oaklib.get_adapter", get_adapter)
+    monkeypatch.setattr(adapter_pool, "_adapters", {})
+    monkeypatch.setattr(adapter_pool, "_thread_local", threading.local())
+
+    ols = get_shared_adapter("ols:cl")
+    assert get_shared_adapter("ols:cl") is ols
+    ubergraph = get_shared_adapter("ubergraph:cl")
+    assert ubergraph is not ols
+    assert created == ["ols:cl", "ubergraph:cl"]
+
+    # sqlite adapters are only reused within the thread that created them
+    sqlite = get_shared_adapter("sqlite:obo:cl")
+    assert get_shared_adapter("sqlite:obo:cl") is sqlite
+    other_thread = []
+    thread = threading.Thread(target=lambda: other_thread.append(get_shared_adapter("sqlite:obo:cl")))
+    thread.start()
+    thread.join()
+    assert other_thread[0] is not sqlite
+    assert created == ["ols:cl", "ubergraph:cl", "sqlite:obo:cl", "sqlite:obo:cl"]
@@ -0,0 +1,21 @@
+import pandas as pd
+
+from cellsem_agent.graphs.cxg_annotate.annotation_io import filter_annotations
+
+
+def test_filter_annotations_keeps_first_cl_match_per_input():
+    df = pd.DataFrame([
+        {"input_name": "SI_TA", "cl_id": "NO MATCH found"},
+        {"input_name": "goblet", "cl_id": "CL:0000160"},
+        {"input_name": "SI_TA", "cl_id": "CL:0009011"},
+        {"input_name": "goblet", "cl_id": "CL:0000160"},
+        {"input_name": "tuft", "cl_id": "NO MATCH found"},
+        {"input_name": "SI_TA", "cl_id": "CL:0009010"},
+    ])
+    filtered = filter_annotations(df)
+    assert filtered.to_dict("records") == [
+        {"input_name": "goblet", "cl_id": "CL:0000160"},
+        {"input_name": "SI_TA", "cl_id": "CL:0009011"},
+        {"input_name": "SI_TA", "cl_id": "CL:0009010"},
+    ]
+    assert list(df.columns) == ["input_name", "cl_id"]
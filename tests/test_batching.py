@@ -0,0 +1,42 @@
+from typing import Optional
+
+from pydantic import BaseModel
+
+from cellsem_agent.graphs.cxg_annotate.batching import estimate_tokens, make_batches, missing_entries, span_key
+
+
+class Entry(BaseModel):
+    name: str
+    full_name: Optional[str] = None
+    tissue_context: Optional[str] = None
+
+
+class Annotation(BaseModel):
+    input_name: str
+
+
+def test_make_batches_respects_budget_size_and_names():
+    short = [Entry(name=f"C{i}", full_name="colonocyte") for i in range(10)]
+    budget = estimate_tokens(short[0]) * 4
+    assert [len(batch) for batch in make_batches(short, budget, max_batch_size=12)] == [4, 4, 2]
+    assert [len(batch) for batch in make_batches(short, budget * 10, max_batch_size=3)] == [3, 3, 3, 1]
+
+    verbose = Entry(name="V", full_name="a very long description " * 1000)
+    batches = make_batches([short[0], verbose, short[1]], budget, max_batch_size=12)
+    assert [[entry.name for entry in batch] for batch in batches] == [["C0"], ["V"], ["C1"]]
+
+    same_name = [Entry(name="SI_TA"), Entry(name="SI_TA", tissue_context="colon")]
+    assert len(make_batches(same_name, budget * 10, max_batch_size=12)) == 2
+    assert [entry for batch in make_batches(short, budget, 12) for entry in batch] == short
+
+
+def test_missing_entries_are_requeued():
+    batch = [Entry(name="SI_TA"), Entry(name="SI_goblet"), Entry(name="SI_EEC")]
+    assert missing_entries(batch, [Annotation(input_name="SI_goblet")]) == [batch[0], batch[2]]
+    assert missing_entries(batch, [Annotation(input_name=entry.name) for entry in batch]) == []
+
+
+def test_span_key_keeps_names_apart():
+    shared = span_key(Entry(name="SI_TA", full_name="Transit-amplifying cells", tissue_context="small intestine"))
+    assert shared == span_key(Entry(name="SI_TA", full_name="transit amplifying cells", tissue_context="Small intestine"))
+    assert shared != span_key(Entry(name="SI_TA2", full_name="transit amplifying cells", tissue_context="small intestine"))
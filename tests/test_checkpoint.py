@@ -0,0 +1,26 @@
+from cellsem_agent.graphs.cxg_annotate.checkpoint import AnnotationCheckpoint
+
+
+def test_checkpoint_round_trip_ignores_truncated_line(tmp_path):
+    checkpoint = AnnotationCheckpoint(str(tmp_path / "checkpoint.jsonl"))
+    annotation = {"input_name": "SI_TA", "cl_id": "CL:0009011", "cl_label": "transit amplifying cell"}
+    checkpoint.append("SI_TA", ("small intestine transit amplifying", "small intestine"), [annotation])
+    with open(checkpoint.path, "a") as f:
+        f.write('{"name": "SI_goblet", "key": ')
+
+    assert checkpoint.load() == {
+        "SI_TA": (("small intestine transit amplifying", "small intestine"), [annotation])}
+    checkpoint.remove()
+    assert checkpoint.load() == {}
+
+
+def test_append_after_truncated_line_keeps_the_record(tmp_path):
+    path = str(tmp_path / "checkpoint.jsonl")
+    AnnotationCheckpoint(path).append("SI_TA", ("si_ta",), [])
+    with open(path, "a") as f:
+        f.write('{"name": "SI_goblet", "key": ')
+
+    checkpoint = AnnotationCheckpoint(path)
+    checkpoint.append("SI_EEC", ("si_eec",), [])
+    checkpoint.append("SI_tuft", ("si_tuft",), [])
+    assert sorted(checkpoint.load()) == ["SI_EEC", "SI_TA", "SI_tuft"]
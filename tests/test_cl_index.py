@@ -0,0 +1,38 @@
+from cellsem_agent.ontology.cl_index import CLIndex, OntologyTerm, normalize_term
+from cellsem_agent.ontology.search_backends import IndexSearchBackend
+
+
+def build_index():
+    return CLIndex([
+        OntologyTerm("CL:0000160", "goblet cell", [("EXACT", "goblet cells"), ("RELATED", "mucous cell")]),
+        OntologyTerm("CL:0000584", "enterocyte", [("EXACT", "intestinal absorptive cell")]),
+        OntologyTerm("CL:0009011", "transit amplifying cell", [("RELATED", "TA cell")]),
+    ])
+
+
+def test_normalize_term():
+    assert normalize_term("  Transit-Amplifying_cell ") == "transit amplifying cell"
+
+
+def test_label_and_synonym_lookup():
+    index = build_index()
+    assert index.search("Goblet cell") == [("CL:0000160", "goblet cell")]
+    assert index.search("intestinal absorptive cell") == [("CL:0000584", "enterocyte")]
+    assert index.search("ta cell") == [("CL:0009011", "transit amplifying cell")]
+    assert index.search("CL_0000584") == [("CL:0000584", "enterocyte")]
+    assert index.search("colonocyte") == []
+
+
+def test_index_backend():
+    backend = IndexSearchBackend(build_index())
+    assert backend.search("transit-amplifying cell") == [("CL:0009011", "transit amplifying cell")]
+
+
+def test_ground_singularized_and_ambiguous_spans():
+    index = build_index()
+    assert index.ground("Goblet cells") == ("CL:0000160", "goblet cell")
+    assert index.ground("Intestinal absorptive cells") == ("CL:0000584", "enterocyte")
+    # related synonyms are not precise enough to ground without review
+    assert index.ground("TA cell") is None
+    index.add(OntologyTerm("CL:9999999", "other goblet cell", [("EXACT", "goblet cell")]))
+    assert index.ground("goblet cell") == ("CL:0000160", "goblet cell")
@@ -0,0 +1,156 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+from pydantic_graph import GraphRunContext
+
+from cellsem_agent.agents.annotator.annotator_agent import TextAnnotation, TextAnnotationResult
+from cellsem_agent.agents.paper_celltype.paper_celltype_agent import CellTypeEntry
+from cellsem_agent.graphs.cxg_annotate import cxg_annotate_graph
+from cellsem_agent.graphs.cxg_annotate.annotation_io import UNFILTERED_TSV
+from cellsem_agent.graphs.cxg_annotate.batching import span_key
+from cellsem_agent.graphs.cxg_annotate.checkpoint import CHECKPOINT_FILE_NAME, AnnotationCheckpoint
+from cellsem_agent.graphs.cxg_annotate.cxg_annotate_graph import GetFullNames, GetGroundings, State
+from cellsem_agent.graphs.cxg_annotate.datasets import Dataset
+from cellsem_agent.graphs.cxg_annotate.expansion_cache import ExpansionCache
+
+
+def make_dataset(datasets_dir, name, labels):
+    folder = datasets_dir / name
+    folder.mkdir()
+    (folder / "paper.pdf").write_bytes(b"%PDF-1.4 paper")
+    (folder / "paper_supp.pdf").write_bytes(b"%PDF-1.4 supplement")
+    (folder / "labels.json").write_text(json.dumps([{"cc.label": label} for label in labels]))
+    return Dataset(name, "paper.pdf", "paper_supp.pdf", "labels.json")
+
+
+def test_expand_group_reextracts_changed_inputs_and_ignores_cache_json(tmp_path, monkeypatch):
+    datasets_dir = tmp_path / "datasets"
+    datasets_dir.mkdir()
+    dataset = make_dataset(datasets_dir, "gut", ["SI_TA"])
+    (datasets_dir / "gut" / "cache.json").write_text(json.dumps([{"name": "SI_TA", "full_name": "stale"}]))
+    extracted = []
+
+    async def extract(self, dataset_name, cc_labels_data, *args):
+        extracted.append([row["cc.label"] for row in cc_labels_data])
+        return [CellTypeEntry(name=row["cc.label"], full_name="transit amplifying cell") for row in cc_labels_data]
+
+    monkeypatch.setattr(GetFullNames, "extract", extract)
+    state = State({}, datasets_dir=str(datasets_dir), prefill_full_names=False)
+    ctx = GraphRunContext(state=state, deps=None)
+    cache = ExpansionCache(str(tmp_path / "cache"))
+
+    def expand():
+        asyncio.run(GetFullNames().expand_group(ctx, [dataset], cache, "test:model"))
+        return [(entry.name, entry.full_name) for entry in state.paper_expansion["gut"]]
+
+    assert expand() == [("SI_TA", "transit amplifying cell")]
+    assert expand() == [("SI_TA", "transit amplifying cell")]
+    assert extracted == [["SI_TA"]]
+
+    (datasets_dir / "gut" / "labels.json").write_text(json.dumps([{"cc.label": "SI_TA"}, {"cc.label": "goblet"}]))
+    assert [name for name, _ in expand()] == ["SI_TA", "goblet"]
+    (datasets_dir / "gut" / "paper.pdf").write_bytes(b"%PDF-1.4 revised paper")
+    expand()
+    assert len(extracted) == 3
+
+    # without its paper the dataset falls back on cache.json
+    (datasets_dir / "gut" / "paper.pdf").unlink()
+    assert expand() == [("SI_TA", "stale")]
+    assert len(extracted) == 3
+
+
+class StubAnnotator:
+    """Annotator agent grounding every entry to "CL:<name>", failing and delaying batches on demand."""
+
+    def __init__(self, failures=None, delays=None):
+        self.failures = dict(failures or {})
+        self.delays = delays or {}
+        self.calls = []
+        self.finished = []
+
+    async def run(self, prompt, **kwargs):
+        names = [entry["name"] for entry in json.loads(prompt)]
+        self.calls.append(names)
+        if self.failures.get(names[0]):
+            self.failures[names[0]] -= 1
+            raise RuntimeError("rate limited")
+        for _ in range(self.delays.get(names[0], 0)):
+            await asyncio.sleep(0)
+        self.finished.append(names)
+        annotations = [TextAnnotation(input_name=name, text=name, cl_id=f"CL:{name}") for name in names]
+        return SimpleNamespace(output=TextAnnotationResult(annotations=annotations))
+
+
+def ground(monkeypatch, datasets_dir, paper_expansion, annotator, **state_options):
+    """Run GetGroundings with a stub annotator and return the annotated names written for each dataset."""
+    monkeypatch.setattr(cxg_annotate_graph, "annotator_agent", annotator)
+    monkeypatch.setattr(cxg_annotate_graph, "get_local_index", lambda: None)
+    sleep = asyncio.sleep
+    monkeypatch.setattr(cxg_annotate_graph.asyncio, "sleep", lambda delay: sleep(0))
+    for dataset_name in paper_expansion:
+        (datasets_dir / dataset_name).mkdir(exist_ok=True)
+    state = State(paper_expansion, datasets_dir=str(datasets_dir), **state_options)
+    asyncio.run(GetGroundings().run(GraphRunContext(state=state, deps=None)))
+    return {dataset_name: list(pd.read_csv(datasets_dir / dataset_name / UNFILTERED_TSV, sep="\t")["input_name"])
+            for dataset_name in paper_expansion}
+
+
+def test_batches_retry_and_keep_entry_order(tmp_path, monkeypatch):
+    monkeypatch.setattr(cxg_annotate_graph, "MAX_BATCH_SIZE", 1)
+    names = ["SI_TA", "SI_goblet", "SI_tuft"]
+    # the first batch fails once and the batches finish in reverse order
+    annotator = StubAnnotator(failures={"SI_TA": 1}, delays={"SI_TA": 20, "SI_goblet": 10})
+    written = ground(monkeypatch, tmp_path, {"gut": [CellTypeEntry(name=name) for name in names]}, annotator)
+
+    assert annotator.calls.count(["SI_TA"]) == 2
+    assert len(annotator.calls) == 4
+    assert annotator.finished == [["SI_tuft"], ["SI_goblet"], ["SI_TA"]]
+    assert written == {"gut": names}
+
+
+def test_failed_batch_is_raised_once_the_others_are_checkpointed(tmp_path, monkeypatch):
+    monkeypatch.setattr(cxg_annotate_graph, "MAX_BATCH_SIZE", 1)
+    annotator = StubAnnotator(failures={"SI_TA": cxg_annotate_graph.BATCH_RETRIES + 1})
+    entries = [CellTypeEntry(name=name) for name in ["SI_TA", "SI_goblet", "SI_tuft"]]
+    with pytest.raises(RuntimeError, match="rate limited"):
+        ground(monkeypatch, tmp_path, {"gut": entries}, annotator)
+
+    completed = AnnotationCheckpoint(str(tmp_path / "gut" / CHECKPOINT_FILE_NAME)).load()
+    assert sorted(completed) == ["SI_goblet", "SI_tuft"]
+
+
+def test_shared_spans_are_grounded_once_for_all_datasets(tmp_path, monkeypatch):
+    def entry(name, full_name="transit amplifying cell"):
+        return CellTypeEntry(name=name, full_name=full_name, tissue_context="small intestine")
+
+    annotator = StubAnnotator()
+    written = ground(monkeypatch, tmp_path, {
+        "gut": [entry("SI_TA"), entry("SI_goblet", "goblet cell")],
+        "gut_atlas": [entry("SI_TA"), entry("TA")],
+    }, annotator)
+
+    grounded = [name for names in annotator.calls for name in names]
+    # TA shares the full name of SI_TA but not its name, so it is grounded on its own
+    assert sorted(grounded) == ["SI_TA", "SI_goblet", "TA"]
+    assert written == {"gut": ["SI_TA", "SI_goblet"], "gut_atlas": ["SI_TA", "TA"]}
+
+
+def test_resumed_run_grounds_only_the_entries_left(tmp_path, monkeypatch):
+    entries = [CellTypeEntry(name=name, full_name=name.lower()) for name in ["SI_TA", "SI_goblet", "SI_tuft", "SI_EEC"]]
+    (tmp_path / "gut").mkdir()
+    checkpoint = AnnotationCheckpoint(str(tmp_path / "gut" / CHECKPOINT_FILE_NAME))
+    checkpoint.append("SI_TA", span_key(entries[0]), [{"input_name": "SI_TA", "text": "SI_TA", "cl_id": "CL:0009011"}])
+    # grounded with another full name, so grounded again
+    checkpoint.append("SI_tuft", ("SI_tuft", "tuft", ""), [{"input_name": "SI_tuft", "text": "SI_tuft"}])
+    with open(checkpoint.path, "a") as f:
+        f.write('{"name": "SI_goblet", "key": ')
+
+    annotator = StubAnnotator()
+    written = ground(monkeypatch, tmp_path, {"gut": entries}, annotator)
+
+    assert annotator.calls == [["SI_goblet", "SI_tuft", "SI_EEC"]]
+    assert written == {"gut": ["SI_TA", "SI_goblet", "SI_tuft", "SI_EEC"]}
+    assert not (tmp_path / "gut" / CHECKPOINT_FILE_NAME).exists()
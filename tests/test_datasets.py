@@ -0,0 +1,29 @@
+import json
+
+from cellsem_agent.graphs.cxg_annotate.datasets import Dataset, load_datasets, schedule, write_manifest
+
+
+def make_dataset(datasets_dir, name, labels, pdf_size):
+    folder = datasets_dir / name
+    folder.mkdir()
+    (folder / "labels.json").write_text(json.dumps([{"cc.label": f"label{i}"} for i in range(labels)]))
+    (folder / "cache.json").write_text("[]")
+    (folder / "paper.pdf").write_bytes(b"0" * pdf_size)
+    (folder / "paper_supp_material.pdf").write_bytes(b"0" * pdf_size)
+
+
+def test_discover_and_schedule(tmp_path):
+    make_dataset(tmp_path, "gut", labels=30, pdf_size=1000)
+    make_dataset(tmp_path, "retina", labels=5, pdf_size=1000)
+    (tmp_path / "empty").mkdir()
+
+    datasets = load_datasets(str(tmp_path))
+    assert datasets == [Dataset("gut", "paper.pdf", "paper_supp_material.pdf", "labels.json"),
+                        Dataset("retina", "paper.pdf", "paper_supp_material.pdf", "labels.json")]
+    assert [dataset.name for dataset in schedule(str(tmp_path), datasets[::-1])] == ["gut", "retina"]
+
+
+def test_manifest_with_name_filter(tmp_path):
+    write_manifest(str(tmp_path / "datasets.json"), [Dataset("Bipolar_cells", "a.pdf", "b.pdf", "c.json"),
+                                                     Dataset("gut", "d.pdf", "e.pdf", "f.json")])
+    assert [dataset.name for dataset in load_datasets(str(tmp_path), ["bipolar*"])] == ["Bipolar_cells"]
@@ -0,0 +1,41 @@
+from cellsem_agent.ontology.cl_index import CLIndex, OntologyTerm
+from cellsem_agent.ontology.fuzzy_index import FuzzyIndex, edit_distance
+
+
+def test_edit_distance():
+    assert edit_distance("colonocytes", "colonocyte") == 1
+    assert edit_distance("kitten", "sitting") == 3
+    assert edit_distance("kitten", "sitting", max_distance=1) == 2
+    assert edit_distance("", "abc") == 3
+
+
+def test_fuzzy_search_ranks_near_misses():
+    index = FuzzyIndex([
+        ("CL:1000347", "colonocyte"),
+        ("CL:1000347", "colon epithelial cell"),
+        ("CL:0000160", "goblet cell"),
+        ("CL:0009011", "transit amplifying cell"),
+    ])
+    assert index.search("colonocytes")[0] == ("CL:1000347", "colonocyte", 0.909)
+    assert index.search("transit-amplifying cells")[0][0] == "CL:0009011"
+    assert index.search("goblet cell") == [("CL:0000160", "goblet cell", 1.0)]
+    assert index.search("fibroblast") == []
+
+
+def test_cl_index_fuzzy_search_reports_labels():
+    index = CLIndex([OntologyTerm("CL:0000584", "enterocyte", [("EXACT", "intestinal absorptive cell")])])
+    assert index.fuzzy_search("intestinal absorptive cells") == [("CL:0000584", "enterocyte", 0.963)]
+
+
+def test_fuzzy_search_memo_is_thread_safe(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    import cellsem_agent.ontology.fuzzy_index as fuzzy_index
+
+    monkeypatch.setattr(fuzzy_index, "MEMO_SIZE", 8)
+    index = FuzzyIndex([("CL:%07d" % i, f"cell type {i}") for i in range(200)])
+    queries = [f"cell typ {i % 40}" for i in range(2000)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(index.search, queries))
+    assert all(results)
+    assert len(index._memo) <= 8
@@ -0,0 +1,19 @@
+from cellsem_agent.agents.paper_celltype.paper_celltype_agent import CellTypeEntry
+from cellsem_agent.agents.paper_celltype.paper_celltype_tools import merge_entries
+
+
+def test_merge_entries_prefers_verbatim_full_name_and_unions_synonyms():
+    texts = ["TA cells are transit amplifying cells of the crypt.",
+             "Small intestine (SI) TA cells proliferate."]
+    results = [
+        [CellTypeEntry(name="SI_TA", full_name="transit amplifying cells", paper_synonyms="TA"),
+         CellTypeEntry(name="goblet")],
+        [CellTypeEntry(name="SI_TA", full_name="small intestine transit amplifying cell",
+                       paper_synonyms="ta; SI TA", tissue_context="small intestine")],
+    ]
+    merged = merge_entries(results, texts, ["goblet", "SI_TA", "tuft"])
+    assert [entry.name for entry in merged] == ["goblet", "SI_TA"]
+    si_ta = merged[1]
+    assert si_ta.full_name == "transit amplifying cells"
+    assert si_ta.paper_synonyms == "TA; SI TA"
+    assert si_ta.tissue_context == "small intestine"
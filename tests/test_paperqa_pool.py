@@ -0,0 +1,107 @@
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from cellsem_agent.graphs.cl_validation import paperqa_pool
+from cellsem_agent.graphs.cl_validation.paperqa_pool import (
+    NoDocumentsError,
+    PaperQAAnswer,
+    PaperQAPool,
+    document_hashes,
+    has_documents,
+    index_is_current,
+    write_hash_manifest,
+)
+
+
+def test_answer_text_and_empty_folder_rejected(tmp_path):
+    answer = PaperQAAnswer(answer="| Assertion | Validated |", references="1. Smith 2020")
+    assert answer.to_text() == "| Assertion | Validated |\n\nReferences: 1. Smith 2020"
+
+    (tmp_path / "notes.json").write_text("{}")
+    assert not has_documents(str(tmp_path))
+    pool = PaperQAPool(max_workers=1)
+    try:
+        with pytest.raises(NoDocumentsError):
+            asyncio.run(pool.ask("Is it true?", str(tmp_path)))
+        with pytest.raises(NoDocumentsError):
+            asyncio.run(pool.ask_documents("Is it true?", []))
+    finally:
+        pool.shutdown()
+    (tmp_path / "paper.pdf").write_bytes(b"%PDF-1.4")
+    assert has_documents(str(tmp_path))
+
+
+def test_index_is_current_follows_document_content(tmp_path):
+    (tmp_path / "review.pdf").write_bytes(b"%PDF-1.4 review")
+    (tmp_path / "notes.json").write_text("{}")
+    assert not index_is_current(str(tmp_path))
+
+    write_hash_manifest(str(tmp_path), document_hashes(str(tmp_path)))
+    assert list(document_hashes(str(tmp_path))) == ["review.pdf"]
+    assert index_is_current(str(tmp_path))
+
+    (tmp_path / "review.pdf").write_bytes(b"%PDF-1.4 revised review")
+    assert not index_is_current(str(tmp_path))
+    write_hash_manifest(str(tmp_path), document_hashes(str(tmp_path)))
+    (tmp_path / "review.pdf").unlink()
+    (tmp_path / "other.md").write_text("# Other")
+    assert not index_is_current(str(tmp_path))
+
+
+def test_timed_out_job_is_cancelled_in_the_worker(monkeypatch):
+    loop = asyncio.new_event_loop()
+    monkeypatch.setattr(paperqa_pool, "_loop", loop)
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def fast(value):
+        return value
+
+    try:
+        with pytest.raises(TimeoutError):
+            paperqa_pool._run(0.01, slow)
+        assert cancelled
+        # the worker loop is free for the next job
+        assert paperqa_pool._run(None, fast, 3) == 3
+    finally:
+        loop.close()
+
+
+class BrokenExecutor:
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_exception(BrokenProcessPool("A worker died"))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+def test_broken_workers_are_replaced_for_the_retry(monkeypatch):
+    loop = asyncio.new_event_loop()
+    monkeypatch.setattr(paperqa_pool, "_loop", loop)
+    executors = [BrokenExecutor(), ThreadPoolExecutor(max_workers=1)]
+    monkeypatch.setattr(PaperQAPool, "_new_executor", lambda self: executors.pop(0))
+
+    async def answer(query):
+        return PaperQAAnswer(answer=query.upper(), references="")
+
+    pool = PaperQAPool(max_workers=1)
+    try:
+        with pytest.raises(BrokenProcessPool):
+            asyncio.run(pool._submit(None, answer, "is it true?"))
+        assert asyncio.run(pool._submit(None, answer, "is it true?")).answer == "IS IT TRUE?"
+        assert not executors
+    finally:
+        pool.shutdown()
+        loop.close()
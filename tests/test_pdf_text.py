@@ -0,0 +1,35 @@
+import os
+
+import fitz
+
+from cellsem_agent.papers import pdf_text
+
+PDF_PATH = os.path.join(os.path.dirname(__file__), "test_data/cell_mappings_input/gut/Burclaff_et_al._(2022)_supp_material.pdf")
+
+
+def test_get_pages_parallel_and_cached(tmp_path, monkeypatch):
+    monkeypatch.setenv("CELLSEM_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(pdf_text, "PARALLEL_MIN_PAGES", 2)
+    monkeypatch.setattr(pdf_text, "PAGES_PER_TASK", 3)
+    with fitz.open(PDF_PATH) as doc:
+        expected = [page.get_text("text") for page in doc]
+
+    assert pdf_text.get_pages(PDF_PATH) == expected
+    assert len(os.listdir(tmp_path / "pdf_text")) == 1
+
+    pdf_text._memo.clear()
+    monkeypatch.setattr(pdf_text, "extract_pages", None)
+    assert pdf_text.get_text(PDF_PATH) == "\n".join(expected)
+
+
+def test_iter_pages_page_range():
+    with fitz.open(PDF_PATH) as doc:
+        expected = [page.get_text("text") for page in doc][2:5]
+    pages = list(pdf_text.iter_pages(PDF_PATH, first_page=3, last_page=5))
+    assert [page.number for page in pages] == [3, 4, 5]
+    assert [page.text for page in pages] == expected
+
+
+def test_detect_headings():
+    text = "Results\nGoblet cells were abundant in the colon.\n2.1 Tissue dissociation\nSupplementary Figure 3\n"
+    assert pdf_text.detect_headings(text) == ["Results", "2.1 Tissue dissociation", "Supplementary Figure 3"]
@@ -0,0 +1,15 @@
+from cellsem_agent.ontology.query_variants import generate_variants
+
+
+def test_abbreviations_are_expanded_with_tissue_rewrites():
+    variants = generate_variants("SI_TA", "small intestine")
+    assert variants[:2] == ["si ta", "small intestine transit amplifying cell"]
+    assert "transit amplifying cell of small intestine" in variants
+    assert "transit amplifying cell" in variants
+
+
+def test_plural_and_tissue_forms():
+    assert generate_variants("Colonic goblet cells") == [
+        "colonic goblet cells", "colonic goblet cell", "goblet cell of colon", "colon goblet cell", "goblet cell"]
+    assert "colonic goblet cell" in generate_variants("Goblet cells of the colon")
+    assert generate_variants("RGC10")[1] == "retinal ganglion cell 10"
@@ -0,0 +1,21 @@
+from cellsem_agent.graphs.cl_validation.reference_store import ReferenceStore
+
+
+def test_shared_documents_are_stored_once(tmp_path):
+    for cl_id in ("CL_4052001", "CL_4033092"):
+        folder = tmp_path / "reference" / cl_id
+        folder.mkdir(parents=True)
+        (folder / "review.pdf").write_bytes(b"%PDF-1.4 shared review")
+    (tmp_path / "reference" / "CL_4033092" / "primary.pdf").write_bytes(b"%PDF-1.4 primary paper")
+    folders = [str(tmp_path / "reference" / cl_id) for cl_id in ("CL_4052001", "CL_4033092")]
+    store = ReferenceStore(str(tmp_path / "store"), fingerprint="test")
+
+    missing = store.missing(folders)
+    assert sorted(path.rsplit("/", 1)[1] for path in missing.values()) == ["primary.pdf", "review.pdf"]
+
+    review_key = next(key for key, path in missing.items() if path.endswith("review.pdf"))
+    with open(store.path(review_key), "wb") as f:
+        f.write(b"stored")
+    assert store.missing(folders[:1]) == {}
+    assert store.view(folders[0]) == [store.path(review_key)]
+    assert len(store.view(folders[1])) == 2
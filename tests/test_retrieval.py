@@ -0,0 +1,37 @@
+from cellsem_agent.papers.abbreviations import find_abbreviations
+from cellsem_agent.papers.bm25 import BM25Index, tokenize
+from cellsem_agent.papers.retrieval import Passage, label_queries, long_forms, select_passages
+
+
+def test_label_queries_split_fragments():
+    assert label_queries("SI_TA") == [["si", "ta"], ["si"], ["ta"]]
+    assert label_queries("C_lateACC") == [["c", "late", "acc"], ["c"], ["late"], ["acc"]]
+    assert label_queries("RGC10") == [["rgc10"], ["rgc"]]
+
+
+def test_bm25_prefers_rare_terms():
+    index = BM25Index(["goblet cells of the colon", "cells of the colon", "tuft cells"])
+    assert index.search(tokenize("goblet cells"), limit=1) == [(0, index.scores(["goblet", "cells"])[0])]
+
+
+def test_select_passages_keeps_document_order():
+    passages = [Passage(1, "Introduction", "The intestinal epithelium renews every few days."),
+                Passage(2, "Results", "Transit amplifying (TA) cells divide rapidly."),
+                Passage(3, "Results", "Tuft cells sense luminal signals."),
+                Passage(4, "Methods", "Small intestine (SI) samples were dissociated.")]
+    selected = select_passages(passages, ["SI_TA"], per_query=1)
+    assert [passage.page for passage in selected] == [2, 4]
+
+
+def test_abbreviated_labels_are_searched_by_their_long_forms():
+    passages = [Passage(1, "Introduction", "Blood holds conventional dendritic cells (cDC) and monocytes."),
+                Passage(2, "Results", "Monocytes expand after infection."),
+                Passage(3, "Results", "Type 2 conventional dendritic cells migrate to the lymph node."),
+                Passage(4, "Methods", "Samples were dissociated and sequenced.")]
+    abbreviations = find_abbreviations(" ".join(passage.text for passage in passages))
+    assert long_forms("cDC2", abbreviations) == ["conventional dendritic cells"]
+    assert label_queries("cDC2", abbreviations)[-1] == ["conventional", "dendritic", "cells"]
+
+    assert 3 not in [passage.page for passage in select_passages(passages, ["cDC2"], per_query=2)]
+    selected = select_passages(passages, ["cDC2"], per_query=2, abbreviations=abbreviations)
+    assert [passage.page for passage in selected] == [1, 3]
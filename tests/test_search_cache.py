@@ -0,0 +1,38 @@
+import time
+
+from cellsem_agent.ontology.search_backends import SearchBackend
+from cellsem_agent.ontology.search_cache import CachedSearchBackend, SearchCache
+
+
+class CountingBackend(SearchBackend):
+    selector = "test"
+
+    def __init__(self):
+        self.calls = 0
+
+    def search(self, term):
+        self.calls += 1
+        return [("CL:0000160", "goblet cell")]
+
+
+def test_cached_backend_memoizes_normalized_terms(tmp_path):
+    backend = CountingBackend()
+    cached = CachedSearchBackend(backend, SearchCache(str(tmp_path / "cache.sqlite")))
+    assert cached.search("Goblet cell") == [("CL:0000160", "goblet cell")]
+    assert cached.search("goblet-cell") == [("CL:0000160", "goblet cell")]
+    assert backend.calls == 1
+    stats = cached.cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+
+def test_ttl_and_lru_eviction(tmp_path):
+    cache = SearchCache(str(tmp_path / "cache.sqlite"), ttl=60, max_entries=10)
+    for i in range(11):
+        cache.put(f"key{i}", i)
+        time.sleep(0.001)
+    assert cache.get("key0") is None
+    assert cache.get("key10") == 10
+    assert cache.stats()["entries"] <= 10
+
+    cache.ttl = 0
+    assert cache.get("key10") is None
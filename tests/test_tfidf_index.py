@@ -0,0 +1,53 @@
+import pytest
+
+import cellsem_agent.ontology.tfidf_index as tfidf_index
+from cellsem_agent.ontology.cl_index import CLIndex, OntologyTerm
+from cellsem_agent.ontology.tfidf_index import TfidfIndex, ground_spans
+
+OBO = """format-version: 1.2
+data-version: cl/releases/2025-01-01
+
+[Term]
+id: CL:0000160
+name: goblet cell
+def: "A cell of the intestinal epithelium that secretes mucus." []
+synonym: "mucous cell" RELATED []
+
+[Term]
+id: CL:0009011
+name: transit amplifying cell
+def: "A rapidly dividing progenitor cell of the intestinal crypt." []
+synonym: "TA cell" RELATED []
+"""
+
+
+def test_query_ranks_terms_by_similarity():
+    index = TfidfIndex(CLIndex([
+        OntologyTerm("CL:0000160", "goblet cell", [("RELATED", "mucous cell")],
+                     definition="A cell of the intestinal epithelium that secretes mucus."),
+        OntologyTerm("CL:0000584", "enterocyte", [("EXACT", "intestinal absorptive cell")]),
+        OntologyTerm("CL:0009011", "transit amplifying cell", [("RELATED", "TA cell")]),
+    ]))
+    results = index.query(["goblet cells", "absorptive intestinal cell", "zzzz"], k=2)
+
+    assert results[0][0][:2] == ("CL:0000160", "goblet cell")
+    assert results[1][0][:2] == ("CL:0000584", "enterocyte")
+    assert results[2] == []
+    assert all(len(spans) <= 2 for spans in results)
+    assert all(0.3 <= score <= 1.0 for spans in results for _, _, score in spans)
+    scores = [score for _, _, score in results[0]]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_ground_spans_requires_a_local_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(tfidf_index, "_tfidf_index", None)
+    monkeypatch.delenv("CL_LOCAL_INDEX", raising=False)
+    monkeypatch.setenv("CL_SEARCH_BACKEND", "ols:cl")
+    with pytest.raises(ValueError):
+        ground_spans(["goblet cell"])
+
+    obo = tmp_path / "cl.obo"
+    obo.write_text(OBO)
+    monkeypatch.setenv("CL_LOCAL_INDEX", str(obo))
+    results = ground_spans(["goblet cells", "transit-amplifying cells"], k=1)
+    assert [spans[0][0] for spans in results] == ["CL:0000160", "CL:0009011"]